@@ -1,45 +1,105 @@
 from app.models import ParsedStatement, RedFlag
+from sqlalchemy import and_, func, insert, literal, select, union
 from sqlalchemy.orm import Session
 
-def run_red_flag_checks(report_id: int, db: Session):
+# Only the current-year figures are checked; comparatives belong to the
+# previous year's report. Statements stored before columns were recorded
+# count as current.
+_CURRENT = func.coalesce(ParsedStatement.column, 0) == 0
+
+
+def _revenue_negative():
+    return select(ParsedStatement.report_id).where(
+        _CURRENT,
+        ParsedStatement.statement_type == "Income Statement",
+        ParsedStatement.line_item.ilike("%revenue%"),
+        ParsedStatement.amount < 0,
+    )
+
+
+def _expenses_exceed_revenue():
+    # A report's revenue is its first revenue line, as read off the page.
+    revenue = select(
+        ParsedStatement.report_id,
+        ParsedStatement.amount,
+        func.row_number().over(partition_by=ParsedStatement.report_id, order_by=ParsedStatement.id).label("n"),
+    ).where(_CURRENT, ParsedStatement.line_item.ilike("%revenue%")).subquery()
+
+    # Expenses are usually printed in brackets, so compare their size.
+    return select(ParsedStatement.report_id).join(
+        revenue, and_(revenue.c.report_id == ParsedStatement.report_id, revenue.c.n == 1)
+    ).where(
+        _CURRENT,
+        ParsedStatement.statement_type == "Income Statement",
+        ParsedStatement.line_item.ilike("%expenses%"),
+        func.abs(ParsedStatement.amount) > revenue.c.amount,
+    )
+
+
+def _negative_total_assets():
+    return select(ParsedStatement.report_id).where(
+        _CURRENT,
+        ParsedStatement.statement_type == "Balance Sheet",
+        ParsedStatement.line_item.ilike("%total assets%"),
+        ParsedStatement.amount < 0,
+    )
+
+
+# (description, severity, rule). Each rule selects the ids of the reports
+# it flags, across every report at once.
+RED_FLAG_RULES = [
+    ("Revenue is negative — possible error or loss", "High", _revenue_negative),
+    ("Expenses exceed Revenue — check financial health", "Medium", _expenses_exceed_revenue),
+    ("Negative Total Assets — possible insolvency", "High", _negative_total_assets),
+]
+
+
+def _flagged(report_ids=None):
     """
-    Runs simple red flag checks on parsed statements.
+    One distinct (report_id, description, severity) row per flag raised,
+    for the given reports or, by default, all of them.
     """
+    selects = []
+    for description, severity, rule in RED_FLAG_RULES:
+        query = rule().add_columns(
+            literal(description).label("description"), literal(severity).label("severity")
+        )
+        if report_ids is not None:
+            query = query.where(ParsedStatement.report_id.in_(report_ids))
+        selects.append(query)
+    return union(*selects).subquery()
+
 
-    statements = db.query(ParsedStatement).filter(ParsedStatement.report_id == report_id).all()
-
-    flags = []
-
-    for stmt in statements:
-        if stmt.statement_type == "Income Statement" and "Revenue" in stmt.line_item:
-            if stmt.amount < 0:
-                flags.append({
-                    "description": "Revenue is negative — possible error or loss",
-                    "severity": "High"
-                })
-
-        if stmt.statement_type == "Income Statement" and "Expenses" in stmt.line_item:
-            revenue = next((s for s in statements if "Revenue" in s.line_item), None)
-            if revenue and stmt.amount > revenue.amount:
-                flags.append({
-                    "description": "Expenses exceed Revenue — check financial health",
-                    "severity": "Medium"
-                })
-
-        if stmt.statement_type == "Balance Sheet" and "Total Assets" in stmt.line_item:
-            if stmt.amount < 0:
-                flags.append({
-                    "description": "Negative Total Assets — possible insolvency",
-                    "severity": "High"
-                })
-
-    for flag in flags:
-        db_flag = RedFlag(
-            report_id=report_id,
-            description=flag["description"],
-            severity=flag["severity"]
+def run_red_flag_sweep(db: Session, report_ids=None) -> int:
+    """
+    Runs every rule as one INSERT ... SELECT over the stored statements and
+    adds the flags not already recorded. Returns the number added. Leave
+    report_ids out to sweep the whole registry. Does not commit.
+    """
+    flagged = _flagged(report_ids)
+    already = select(RedFlag.id).where(
+        RedFlag.report_id == flagged.c.report_id,
+        RedFlag.description == flagged.c.description,
+        RedFlag.severity == flagged.c.severity,
+    ).exists()
+    result = db.execute(
+        insert(RedFlag).from_select(
+            ["report_id", "description", "severity"],
+            select(flagged.c.report_id, flagged.c.description, flagged.c.severity).where(~already),
         )
-        db.add(db_flag)
+    )
+    return result.rowcount
+
 
+def run_red_flag_checks(report_id: int, db: Session):
+    """
+    Runs simple red flag checks on parsed statements.
+    """
+    run_red_flag_sweep(db, [report_id])
     db.commit()
-    return flags
+
+    flagged = _flagged([report_id])
+    return [
+        {"description": description, "severity": severity}
+        for description, severity in db.execute(select(flagged.c.description, flagged.c.severity))
+    ]
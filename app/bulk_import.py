@@ -0,0 +1,324 @@
+"""
+Bulk import of annual filings from a ZIP archive or a directory tree.
+
+Files are matched to companies by path, in either of the layouts used
+under data/:
+
+    <company_id>/<year>/<anything>.pdf
+    <Company Name> - AUDITED FINANCIALS.pdf   (year from the path or --year)
+
+Extraction and line-item parsing run in parallel worker processes and
+the resulting FinancialReport and ParsedStatement rows are inserted in
+batched transactions. The server's /bulk_import does not do this itself:
+it unpacks the archive and queues an ingestion job per file instead (see
+enqueue_zip), so the work runs in the background on the shared pool.
+
+    python -m app.bulk_import data/reports
+    python -m app.bulk_import filings.zip --year 2025 --workers 8
+"""
+import argparse
+import logging
+import os
+import re
+import shutil
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy.orm import Session
+from services.compliance import apply_compliance_status
+from services.extraction import extract_numbers_from_file
+from services.extraction_cache import ExtractionCache, sha256_file
+from services.extraction_pool import EXTRACTION_WORKERS, MAX_UPLOAD_BYTES, worker_context
+from services.search_index import page_texts_file
+from services.statement_parser import parse_statements_file
+from services.storage import FileTooLarge, save_stream
+from .analysis.analysis import run_red_flag_sweep
+from .database import SessionLocal, engine
+from .ingestion import build_report, enqueue_jobs, save_line_items
+from .metrics import refresh_company_metrics
+from .migrations import upgrade_schema
+from .models import Company, FinancialReport, IngestionJob
+from .search import search_index
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = "uploads"
+BATCH_SIZE = 100
+# Largest ZIP archive /bulk_import accepts; each PDF inside is still held
+# to MAX_UPLOAD_BYTES.
+MAX_ZIP_BYTES = int(float(os.getenv("AFRS_MAX_ZIP_MB", 500)) * 1024 * 1024)
+
+_YEAR = re.compile(r"(?<!\d)(19\d{2}|20\d{2})(?!\d)")
+
+
+# Spellings that differ between the registry and filing names.
+_ABBREVIATIONS = {"limited": "ltd", "holdings": "holding", "company": "co", "corporation": "corp"}
+
+
+def _normalise(name: str) -> str:
+    words = re.sub(r"[^0-9a-z]+", " ", name.lower()).split()
+    return " ".join(_ABBREVIATIONS.get(w, w) for w in words)
+
+
+class CompanyMatcher:
+    """
+    Resolves a relative file path to (company_id, year) using the
+    companies already registered.
+    """
+
+    def __init__(self, companies, default_year=None):
+        self.ids = {c.id for c in companies}
+        # Longest names first so "Olympia Capital Holdings" wins over "Olympia".
+        self.names = sorted(
+            ((_normalise(c.name), c.id) for c in companies if c.name),
+            key=lambda item: -len(item[0]),
+        )
+        self.default_year = default_year
+
+    def match(self, relative_path: str):
+        parts = [p for p in re.split(r"[\\/]+", relative_path) if p]
+        directories, filename = parts[:-1], parts[-1]
+        stem = _normalise(os.path.splitext(filename)[0])
+
+        company_id = None
+        year = None
+        for part in directories:
+            if part.isdigit() and _YEAR.fullmatch(part):
+                year = int(part)
+            elif part.isdigit() and int(part) in self.ids:
+                company_id = int(part)
+
+        if company_id is None:
+            candidates = [_normalise(p) for p in directories] + [stem]
+            for name, cid in self.names:
+                if any(c == name or c.startswith(name + " ") for c in candidates):
+                    company_id = cid
+                    break
+
+        if year is None:
+            found = _YEAR.search(filename)
+            year = int(found.group(1)) if found else self.default_year
+
+        return company_id, year
+
+
+def _iter_directory(root: str):
+    for dirpath, _dirnames, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            if filename.lower().endswith(".pdf"):
+                path = os.path.join(dirpath, filename)
+                yield os.path.relpath(path, root), path
+
+
+def _plan(db: Session, entries, default_year):
+    """
+    Splits (relative_path, source) entries into files to import, keyed by
+    (company_id, year), and skipped files with a reason. A company and
+    year that already has a report, or an ingestion job still waiting to
+    produce one, is skipped as a duplicate.
+    """
+    matcher = CompanyMatcher(db.query(Company).all(), default_year)
+    existing = set(db.query(FinancialReport.company_id, FinancialReport.year).all())
+    queued = set(
+        db.query(IngestionJob.company_id, IngestionJob.year)
+        .filter(IngestionJob.kind == "ingest", IngestionJob.status.in_(("queued", "running")))
+        .all()
+    )
+
+    planned = {}
+    skipped = []
+    for relative_path, source in entries:
+        company_id, year = matcher.match(relative_path)
+        if company_id is None:
+            skipped.append({"file": relative_path, "reason": "no matching company"})
+        elif year is None:
+            skipped.append({"file": relative_path, "reason": "year not found"})
+        elif (company_id, year) in existing or (company_id, year) in planned:
+            skipped.append({"file": relative_path, "reason": f"report for {year} already exists"})
+        elif (company_id, year) in queued:
+            skipped.append({"file": relative_path, "reason": f"report for {year} is already queued"})
+        else:
+            planned[(company_id, year)] = (relative_path, source)
+    return planned, skipped
+
+
+def _store(planned, read_source, skipped):
+    """
+    Copies each planned file to UPLOAD_DIR under the same name single
+    uploads use, and returns [(company_id, year, relative_path, stored_path)].
+    Files read_source finds too large are skipped.
+    """
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    stored = []
+    for (company_id, year), (relative_path, source) in planned.items():
+        target = os.path.join(UPLOAD_DIR, f"{company_id}_{year}.pdf")
+        try:
+            read_source(source, target)
+        except FileTooLarge:
+            skipped.append({"file": relative_path, "reason": "file is too large"})
+            continue
+        stored.append((company_id, year, relative_path, target))
+    return stored
+
+
+def _extract_all(stored, skipped, workers, cache):
+    """
+    Yields (company_id, year, relative_path, extracted, statements, pages)
+    for each stored file, in order. Headline figures come from the cache
+    where possible; the remaining extractions, every line-item parse and
+    the page text for the search index run in parallel worker processes.
+    At most two files per worker are in flight, so results never pile up
+    ahead of the inserts however large the import.
+    """
+    if not stored:
+        return
+    with ProcessPoolExecutor(max_workers=workers, mp_context=worker_context()) as executor:
+
+        def submit(company_id, year, relative_path, path):
+            digest = sha256_file(path)
+            cached = cache.get(digest)
+            extraction = executor.submit(extract_numbers_from_file, path) if cached is None else None
+            parse = executor.submit(parse_statements_file, path)
+            text = executor.submit(page_texts_file, path)
+            return company_id, year, relative_path, digest, cached, extraction, parse, text
+
+        in_flight = deque()
+        pending = iter(stored)
+        for item in pending:
+            in_flight.append(submit(*item))
+            if len(in_flight) >= workers * 2:
+                break
+        while in_flight:
+            company_id, year, relative_path, digest, extracted, extraction, parse, text = in_flight.popleft()
+            next_item = next(pending, None)
+            if next_item is not None:
+                in_flight.append(submit(*next_item))
+            if extraction is not None:
+                try:
+                    extracted = extraction.result()
+                except Exception as e:
+                    skipped.append({"file": relative_path, "reason": f"extraction failed: {e}"})
+                    continue
+                cache.put(digest, extracted)
+            try:
+                statements = parse.result()
+            except Exception:
+                logger.exception("Could not parse line items from %s", relative_path)
+                statements = []
+            try:
+                pages = text.result()
+            except Exception:
+                logger.exception("Could not read page text from %s", relative_path)
+                pages = None
+            yield company_id, year, relative_path, extracted, statements, pages
+
+
+def _extract_and_insert(db: Session, stored, skipped, workers, batch_size, cache=None, index=search_index):
+    cache = cache or ExtractionCache()
+    companies = {c.id: c for c in db.query(Company).filter(Company.id.in_({s[0] for s in stored}))}
+    imported = []
+    batch = []
+
+    def flush():
+        reports = [report for report, _, _ in batch]
+        apply_compliance_status(reports, companies)
+        db.add_all(reports)
+        db.flush()
+        for report, statements, _ in batch:
+            save_line_items(db, report.id, statements)
+        run_red_flag_sweep(db, [report.id for report in reports])
+        for report in reports:
+            refresh_company_metrics(db, report.company_id, report.year)
+        pages = [(report.id, report.company_id, report.year, texts) for report, _, texts in batch if texts is not None]
+        db.commit()
+        index.index_reports(pages)
+        batch.clear()
+
+    for company_id, year, relative_path, extracted, statements, pages in _extract_all(stored, skipped, workers, cache):
+        batch.append((build_report(company_id, year, extracted), statements, pages))
+        imported.append({"file": relative_path, "company_id": company_id, "year": year})
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch:
+        flush()
+    return imported
+
+
+def import_directory(db: Session, root: str, default_year=None, workers=EXTRACTION_WORKERS, batch_size=BATCH_SIZE) -> dict:
+    planned, skipped = _plan(db, _iter_directory(root), default_year)
+    stored = _store(planned, shutil.copyfile, skipped)
+    imported = _extract_and_insert(db, stored, skipped, workers, batch_size)
+    return {"imported": imported, "skipped": skipped}
+
+
+def _unpack_zip(db: Session, zip_path: str, default_year=None, max_bytes=MAX_UPLOAD_BYTES):
+    """
+    Plans and stores the PDFs in a ZIP archive. The size limit is applied
+    to the bytes actually read out of each member, not to the size the
+    archive declares for it.
+    """
+    with zipfile.ZipFile(zip_path) as archive:
+        entries = [
+            (info.filename, info) for info in archive.infolist()
+            if not info.is_dir() and info.filename.lower().endswith(".pdf")
+        ]
+        planned, skipped = _plan(db, entries, default_year)
+
+        def read_member(info, target):
+            with archive.open(info) as src:
+                save_stream(src, target, max_bytes)
+
+        stored = _store(planned, read_member, skipped)
+    return stored, skipped
+
+
+def import_zip(db: Session, zip_path: str, default_year=None, workers=EXTRACTION_WORKERS, batch_size=BATCH_SIZE) -> dict:
+    stored, skipped = _unpack_zip(db, zip_path, default_year)
+    imported = _extract_and_insert(db, stored, skipped, workers, batch_size)
+    return {"imported": imported, "skipped": skipped}
+
+
+def enqueue_zip(db: Session, zip_path: str, default_year=None) -> dict:
+    """
+    Stores the PDFs in a ZIP archive and queues an ingestion job for each,
+    without extracting anything here. Returns the queued jobs and the
+    skipped files.
+    """
+    stored, skipped = _unpack_zip(db, zip_path, default_year)
+    job_ids = enqueue_jobs(db, [(company_id, year, path) for company_id, year, _, path in stored])
+    jobs = [
+        {"file": relative_path, "company_id": company_id, "year": year,
+         "job_id": job_id, "status_url": f"/jobs/{job_id}"}
+        for (company_id, year, relative_path, _), job_id in zip(stored, job_ids)
+    ]
+    return {"jobs": jobs, "skipped": skipped}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import audited financials.")
+    parser.add_argument("source", help="ZIP archive or directory of PDFs")
+    parser.add_argument("--year", type=int, help="year for files whose path has none")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    upgrade_schema(engine)
+    db = SessionLocal()
+    try:
+        if os.path.isdir(args.source):
+            result = import_directory(db, args.source, args.year, args.workers, args.batch_size)
+        else:
+            result = import_zip(db, args.source, args.year, args.workers, args.batch_size)
+    finally:
+        db.close()
+
+    for item in result["imported"]:
+        print(f"imported  {item['file']} -> company {item['company_id']}, {item['year']}")
+    for item in result["skipped"]:
+        print(f"skipped   {item['file']}: {item['reason']}")
+    print(f"{len(result['imported'])} imported, {len(result['skipped'])} skipped")
+
+
+if __name__ == "__main__":
+    main()
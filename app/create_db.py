@@ -1,7 +1,5 @@
-from sqlalchemy import create_engine
-from models import Base
-
-engine = create_engine("sqlite:///./app.db") 
+from .database import engine
+from .models import Base
 
 Base.metadata.drop_all(bind=engine)
 Base.metadata.create_all(bind=engine)
@@ -1,14 +1,80 @@
-
-from sqlalchemy import create_engine
+import os
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from services.telemetry import record_query
+
+# Any SQLAlchemy URL, e.g. postgresql+psycopg2://afrs:secret@db/afrs
+SQLALCHEMY_DATABASE_URL = os.getenv("AFRS_DATABASE_URL") or os.getenv("DATABASE_URL") or "sqlite:///./app.db"
+
+# Connection pool for server databases. Size it to the threadpool plus
+# the ingestion workers of one process; overflow absorbs bursts.
+DB_POOL_SIZE = int(os.getenv("AFRS_DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("AFRS_DB_MAX_OVERFLOW", 20))
+DB_POOL_TIMEOUT = float(os.getenv("AFRS_DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("AFRS_DB_POOL_RECYCLE", 1800))
+
+# How long a SQLite writer waits for the lock before "database is locked".
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("AFRS_SQLITE_BUSY_TIMEOUT_MS", 5000))
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    WAL lets readers carry on while a report is being written, and
+    synchronous=NORMAL is durable in WAL mode without an fsync per commit.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./app.db"
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    context.afrs_query_start = time.perf_counter()
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    # Labelled by verb only (SELECT, INSERT, ...) to keep the series few.
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+    record_query(verb, time.perf_counter() - context.afrs_query_start)
+
+
+def build_engine(url=SQLALCHEMY_DATABASE_URL):
+    url = make_url(url.replace("postgres://", "postgresql://", 1))
+    if url.get_backend_name() == "sqlite":
+        engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        )
+        if url.database and url.database != ":memory:":
+            event.listen(engine, "connect", _sqlite_pragmas)
+    else:
+        engine = create_engine(
+            url,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=True,
+        )
+    event.listen(engine, "before_cursor_execute", _query_started)
+    event.listen(engine, "after_cursor_execute", _query_finished)
+    return engine
+
+
+engine = build_engine()
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
+
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -0,0 +1,239 @@
+"""
+Registry exports: every company, or every report with its company and
+computed compliance fields, as CSV, JSON Lines or Parquet. Rows are read
+from the database in chunks through a server-side cursor and written out
+chunk by chunk, so an export runs in constant memory however large the
+registry is. Parquet needs pyarrow.
+
+    python -m app.export reports --format csv -o registry.csv
+    python -m app.export reports --year 2025 --company-type issuer --format parquet -o issuers.parquet
+    python -m app.export companies --format jsonl -o companies.jsonl
+"""
+import argparse
+import csv
+import importlib.util
+import io
+import json
+import math
+import os
+import sys
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from services.compliance import evaluate_batch
+from .database import SessionLocal, engine
+from .migrations import upgrade_schema
+from .models import Company, FinancialReport
+
+EXPORT_CHUNK_ROWS = int(os.getenv("AFRS_EXPORT_CHUNK_ROWS", 1000))
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# (name, type) of the columns of each dataset, in output order. The types
+# fix the Parquet schema, so every row group agrees even when a chunk is
+# all nulls.
+COMPANY_COLUMNS = (
+    ("id", "int"), ("name", "str"), ("company_type", "str"), ("market_segment", "str"),
+)
+_COMPLIANCE_COLUMNS = (
+    ("share_capital_req", "float"), ("liquid_capital_req", "float"), ("net_assets_req", "float"),
+    ("solvency_ratio", "float"), ("share_capital_met", "bool"), ("liquid_capital_met", "bool"),
+    ("net_assets_met", "bool"), ("thresholds_met", "bool"),
+)
+REPORT_COLUMNS = (
+    ("report_id", "int"), ("company_id", "int"), ("company_name", "str"), ("company_type", "str"),
+    ("market_segment", "str"), ("year", "int"), ("share_capital", "float"), ("liquid_capital", "float"),
+    ("net_assets", "float"), ("total_liabilities", "float"), ("submission_requirements_met", "bool"),
+    ("publication_requirements_met", "bool"), ("review_completed", "bool"),
+) + _COMPLIANCE_COLUMNS
+DATASETS = {"companies": COMPANY_COLUMNS, "reports": REPORT_COLUMNS}
+
+
+def parquet_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def company_query(company_type=None, market_segment=None):
+    query = select(Company.id, Company.name, Company.company_type, Company.market_segment)
+    if company_type:
+        query = query.where(Company.company_type == company_type)
+    if market_segment:
+        query = query.where(Company.market_segment == market_segment)
+    return query.order_by(Company.id)
+
+
+def report_query(years=None, company_ids=None, company_type=None, market_segment=None):
+    query = select(
+        FinancialReport.id, FinancialReport.company_id, Company.name, Company.company_type,
+        Company.market_segment, FinancialReport.year, FinancialReport.share_capital,
+        FinancialReport.liquid_capital, FinancialReport.net_assets, FinancialReport.total_liabilities,
+        FinancialReport.submission_requirements_met, FinancialReport.publication_requirements_met,
+        FinancialReport.review_completed,
+    ).join(Company, Company.id == FinancialReport.company_id)
+    if years:
+        query = query.where(FinancialReport.year.in_(years))
+    if company_ids:
+        query = query.where(FinancialReport.company_id.in_(company_ids))
+    if company_type:
+        query = query.where(Company.company_type == company_type)
+    if market_segment:
+        query = query.where(Company.market_segment == market_segment)
+    return query.order_by(FinancialReport.id)
+
+
+def _plain(value):
+    # numpy scalars to Python values, NaN to None.
+    if hasattr(value, "item"):
+        value = value.item()
+    return None if isinstance(value, float) and math.isnan(value) else value
+
+
+def company_dicts(rows) -> list:
+    return [dict(zip((name for name, _ in COMPANY_COLUMNS), row)) for row in rows]
+
+
+def report_dicts(rows) -> list:
+    """
+    Report rows as dicts, with the compliance fields of the whole chunk
+    computed in one evaluate_batch call.
+    """
+    if not rows:
+        return []
+    columns = list(zip(*rows))
+    result = evaluate_batch(*columns[3:5], *columns[6:10])
+    names = [name for name, _ in REPORT_COLUMNS[:len(columns)]]
+    return [
+        {
+            **dict(zip(names, row)),
+            **{name: _plain(result[name][i]) for name, _ in _COMPLIANCE_COLUMNS},
+        }
+        for i, row in enumerate(rows)
+    ]
+
+
+def _dataset(dataset, filters):
+    if dataset == "companies":
+        return company_query(filters.get("company_type"), filters.get("market_segment")), company_dicts
+    return report_query(**filters), report_dicts
+
+
+def iter_chunks(db: Session, dataset: str, filters=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Yields the dataset as lists of dicts of at most chunk_rows rows. With
+    yield_per, PostgreSQL uses a server-side cursor and SQLite steps its
+    cursor as rows are read, so only one chunk is in memory at a time.
+    """
+    query, to_dicts = _dataset(dataset, filters or {})
+    result = db.execute(query.execution_options(yield_per=chunk_rows))
+    for partition in result.partitions():
+        yield to_dicts(partition)
+
+
+def write_csv(chunks, columns):
+    names = [name for name, _ in columns]
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=names, lineterminator="\n")
+    writer.writeheader()
+    for chunk in chunks:
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def write_jsonl(chunks, columns):
+    for chunk in chunks:
+        yield "".join(json.dumps(row) + "\n" for row in chunk).encode()
+
+
+class _Sink:
+    # Append-only file for ParquetWriter; the caller drains it per chunk.
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def write_parquet(chunks, columns):
+    """
+    One row group per chunk; each is yielded as soon as it is written.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {"int": pa.int64(), "str": pa.string(), "float": pa.float64(), "bool": pa.bool_()}
+    schema = pa.schema([(name, types[kind]) for name, kind in columns])
+    sink = _Sink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema)
+    try:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+_WRITERS = {"csv": write_csv, "jsonl": write_jsonl, "parquet": write_parquet}
+
+
+def stream_export(dataset: str, fmt: str, filters=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Yields the export as bytes. Opens its own session, held for as long as
+    the export is being read, so it can be handed to a streaming response.
+    """
+    db = SessionLocal()
+    try:
+        yield from _WRITERS[fmt](iter_chunks(db, dataset, filters, chunk_rows), DATASETS[dataset])
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the registry.")
+    parser.add_argument("dataset", choices=DATASETS)
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("--year", type=int, action="append", help="report year (repeatable)")
+    parser.add_argument("--company-id", type=int, action="append", help="only this company (repeatable)")
+    parser.add_argument("--company-type", help="only companies of this type")
+    parser.add_argument("--market-segment", help="only companies in this segment")
+    parser.add_argument("-o", "--output", required=True)
+    args = parser.parse_args()
+
+    if args.format == "parquet" and not parquet_available():
+        sys.exit("Parquet export needs pyarrow: pip install pyarrow")
+    filters = {"company_type": args.company_type, "market_segment": args.market_segment}
+    if args.dataset == "reports":
+        filters.update(years=args.year, company_ids=args.company_id)
+
+    upgrade_schema(engine)
+    with open(args.output, "wb") as out:
+        for data in stream_export(args.dataset, args.format, filters):
+            out.write(data)
+    print(f"wrote {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
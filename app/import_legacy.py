@@ -0,0 +1,202 @@
+"""
+One-shot import of the SQLite files earlier prototypes left under data/
+into the application database:
+
+    data/financial_data.db    companies, reports (revenue and profit)
+    data/redflags.db          financial_reports, parsed_statements, red_flags
+    data/processed/data.db    parsed_files
+
+Legacy reports are matched to registered companies by name (spelled as
+in app.bulk_import) and year. Their statements and red flags are attached
+to the matching FinancialReport; revenue and profit become Income
+Statement line items. Rows already present are not imported twice, so
+the tool can be re-run. The legacy files are only read.
+
+    python -m app.import_legacy
+    python -m app.import_legacy --data-dir /backups/data
+"""
+import argparse
+import os
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from .bulk_import import _normalise
+from .database import SessionLocal, engine
+from .migrations import upgrade_schema
+from .models import Company, FinancialReport, ParsedFile, ParsedStatement, RedFlag
+
+DATA_DIR = "data"
+BATCH_SIZE = 1000
+
+
+def _read(path: str, sql: str):
+    """
+    Rows of a query against a legacy database, opened read-only. Missing
+    files and tables read as empty.
+    """
+    if not os.path.exists(path):
+        return []
+    conn = sqlite3.connect(Path(path).resolve().as_uri() + "?mode=ro", uri=True)
+    try:
+        return conn.execute(sql).fetchall()
+    except sqlite3.OperationalError:
+        return []
+    finally:
+        conn.close()
+
+
+def _bulk_insert(db: Session, model, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.execute(insert(model), rows[start:start + BATCH_SIZE])
+
+
+class _ReportResolver:
+    """
+    Maps a legacy (company name, year) to a FinancialReport id, recording
+    the reports that cannot be matched.
+    """
+
+    def __init__(self, db: Session, skipped):
+        self.companies = {_normalise(name): cid for cid, name in db.query(Company.id, Company.name) if name}
+        self.reports = {(cid, year): rid for rid, cid, year in db.query(
+            FinancialReport.id, FinancialReport.company_id, FinancialReport.year
+        )}
+        self.skipped = skipped
+
+    def resolve(self, source, name, year):
+        company_id = self.companies.get(_normalise(name or ""))
+        if company_id is None:
+            self.skipped.append({"source": source, "item": f"{name} {year}", "reason": "no matching company"})
+            return None
+        report_id = self.reports.get((company_id, year))
+        if report_id is None:
+            self.skipped.append({"source": source, "item": f"{name} {year}", "reason": "no report for that year"})
+        return report_id
+
+
+def _new_rows(db: Session, model, key_columns, rows):
+    """
+    Drops rows (dicts) that already exist, or repeat, by key_columns.
+    """
+    report_ids = {row["report_id"] for row in rows}
+    existing = set(
+        db.query(*(getattr(model, c) for c in key_columns)).filter(model.report_id.in_(report_ids))
+    ) if report_ids else set()
+    fresh = []
+    for row in rows:
+        key = tuple(row[c] for c in key_columns)
+        if key not in existing:
+            existing.add(key)
+            fresh.append(row)
+    return fresh
+
+
+def import_redflags(db: Session, path: str, resolver: _ReportResolver) -> dict:
+    legacy_reports = {}
+    years = {}
+    for rid, name, year in _read(path, """
+            SELECT r.id, c.name, r.year FROM financial_reports r
+            LEFT JOIN companies c ON c.id = r.company_id"""):
+        legacy_reports[rid] = resolver.resolve(path, name, year)
+        years[rid] = year
+
+    statements = [
+        {
+            "report_id": legacy_reports[rid], "statement_type": st, "line_item": item, "amount": amount,
+            "year": years[rid], "column": 0,
+        }
+        for rid, st, item, amount in _read(path, "SELECT report_id, statement_type, line_item, amount FROM parsed_statements")
+        if legacy_reports.get(rid) is not None
+    ]
+    flags = [
+        {"report_id": legacy_reports[rid], "description": description, "severity": severity}
+        for rid, description, severity in _read(path, "SELECT report_id, description, severity FROM red_flags")
+        if legacy_reports.get(rid) is not None
+    ]
+
+    statements = _new_rows(db, ParsedStatement, ("report_id", "statement_type", "line_item", "amount"), statements)
+    flags = _new_rows(db, RedFlag, ("report_id", "description", "severity"), flags)
+    _bulk_insert(db, ParsedStatement, statements)
+    _bulk_insert(db, RedFlag, flags)
+    return {"parsed_statements": len(statements), "red_flags": len(flags)}
+
+
+def import_financial_data(db: Session, path: str, resolver: _ReportResolver) -> dict:
+    statements = []
+    for name, year, revenue, profit in _read(path, """
+            SELECT c.name, r.year, r.revenue, r.profit FROM reports r
+            LEFT JOIN companies c ON c.id = r.company_id"""):
+        report_id = resolver.resolve(path, name, year)
+        if report_id is None:
+            continue
+        for line_item, amount in (("Revenue", revenue), ("Profit", profit)):
+            if amount is not None:
+                statements.append({
+                    "report_id": report_id, "statement_type": "Income Statement",
+                    "line_item": line_item, "amount": amount, "year": year, "column": 0,
+                })
+
+    statements = _new_rows(db, ParsedStatement, ("report_id", "statement_type", "line_item", "amount"), statements)
+    _bulk_insert(db, ParsedStatement, statements)
+    return {"parsed_statements": len(statements)}
+
+
+def import_parsed_files(db: Session, path: str) -> dict:
+    existing = {filename for filename, in db.query(ParsedFile.filename)}
+    rows = []
+    for filename, message, uploaded_at in _read(path, "SELECT filename, parsed_message, uploaded_at FROM parsed_files"):
+        if filename in existing:
+            continue
+        existing.add(filename)
+        rows.append({
+            "filename": filename,
+            "parsed_message": message,
+            "uploaded_at": datetime.fromisoformat(uploaded_at) if uploaded_at else None,
+        })
+    _bulk_insert(db, ParsedFile, rows)
+    return {"parsed_files": len(rows)}
+
+
+def import_legacy(db: Session, data_dir: str = DATA_DIR) -> dict:
+    """
+    Imports all three legacy databases in one transaction and returns the
+    number of rows added per table plus the legacy reports that were
+    skipped.
+    """
+    skipped = []
+    resolver = _ReportResolver(db, skipped)
+    imported = {"parsed_statements": 0, "red_flags": 0, "parsed_files": 0}
+    results = [
+        import_redflags(db, os.path.join(data_dir, "redflags.db"), resolver),
+        import_financial_data(db, os.path.join(data_dir, "financial_data.db"), resolver),
+        import_parsed_files(db, os.path.join(data_dir, "processed", "data.db")),
+    ]
+    for result in results:
+        for table, count in result.items():
+            imported[table] += count
+    db.commit()
+    return {"imported": imported, "skipped": skipped}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import the legacy SQLite files under data/.")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    args = parser.parse_args()
+
+    upgrade_schema(engine)
+    db = SessionLocal()
+    try:
+        result = import_legacy(db, args.data_dir)
+    finally:
+        db.close()
+
+    for item in result["skipped"]:
+        print(f"skipped   {item['item']} ({item['source']}): {item['reason']}")
+    for table, count in result["imported"].items():
+        print(f"{count:>6} {table}")
+
+
+if __name__ == "__main__":
+    main()
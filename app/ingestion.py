@@ -0,0 +1,328 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import and_, insert, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from services.compliance import apply_compliance_status
+from services.extraction_pool import ExtractionError, ExtractionQueueFull
+from services.search_index import page_texts_file
+from services.statement_parser import parse_statements_file
+from services.telemetry import span
+from .analysis.analysis import run_red_flag_sweep
+from .database import SessionLocal
+from .metrics import refresh_company_metrics
+from .models import Company, FinancialReport, IngestionJob, ParsedStatement
+
+logger = logging.getLogger(__name__)
+
+INGESTION_CONCURRENCY = int(os.getenv("AFRS_INGESTION_CONCURRENCY", 2))
+INGESTION_POLL_INTERVAL = float(os.getenv("AFRS_INGESTION_POLL_INTERVAL", 2))
+# A running job whose worker has not renewed its lease for this long is
+# taken to be abandoned (its process died) and is claimed again.
+INGESTION_LEASE_SECONDS = float(os.getenv("AFRS_INGESTION_LEASE_SECONDS", 60))
+
+
+def build_report(company_id: int, year: int, extracted: dict) -> FinancialReport:
+    """
+    Turns an extract_numbers_from_pdf result into a FinancialReport row.
+    """
+    net_assets = extracted.get("net_assets", 0) or (
+        extracted.get("total_assets", 0) - extracted.get("total_liabilities", 0)
+        if extracted.get("total_assets", 0) and extracted.get("total_liabilities", 0)
+        else 0
+    )
+
+    return FinancialReport(
+        company_id=company_id,
+        year=year,
+        share_capital=extracted.get("share_capital") or 0,
+        liquid_capital=extracted.get("liquid_capital") or 0,
+        net_assets=net_assets,
+        total_liabilities=extracted.get("total_liabilities") or 0,
+        submission_requirements_met=True,
+        publication_requirements_met=True
+    )
+
+
+def save_line_items(db: Session, report_id: int, statements: list):
+    """
+    Bulk-inserts parse_statements output as the report's ParsedStatement
+    rows, in the caller's transaction.
+    """
+    if statements:
+        db.execute(insert(ParsedStatement), [{**item, "report_id": report_id} for item in statements])
+
+
+def enqueue_job(db: Session, company_id: int, year: int, file_path: str) -> IngestionJob:
+    job = IngestionJob(company_id=company_id, year=year, file_path=file_path, status="queued", progress=0)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def enqueue_jobs(db: Session, files) -> list:
+    """
+    enqueue_job for many (company_id, year, file_path) at once, in one
+    transaction. Returns the new job ids in the same order.
+    """
+    jobs = [
+        IngestionJob(company_id=company_id, year=year, file_path=file_path, status="queued", progress=0)
+        for company_id, year, file_path in files
+    ]
+    db.add_all(jobs)
+    db.flush()
+    job_ids = [job.id for job in jobs]
+    db.commit()
+    return job_ids
+
+
+class LeaseLost(Exception):
+    """Another worker has taken over the job; its result must be dropped."""
+
+
+def _held_by(owner: str):
+    return and_(IngestionJob.lease_owner == owner, IngestionJob.status == "running")
+
+
+def set_job(job_id: int, owner=None, **fields) -> bool:
+    """
+    Updates a job. With `owner`, only while that worker still holds the
+    job's lease; returns whether the job was updated.
+    """
+    db = SessionLocal()
+    try:
+        query = db.query(IngestionJob).filter(IngestionJob.id == job_id)
+        if owner is not None:
+            query = query.filter(_held_by(owner))
+        updated = query.update(fields, synchronize_session=False)
+        db.commit()
+        return bool(updated)
+    finally:
+        db.close()
+
+
+def _claimable(now):
+    stale = now - timedelta(seconds=INGESTION_LEASE_SECONDS)
+    return and_(
+        IngestionJob.kind == "ingest",
+        or_(
+            IngestionJob.status == "queued",
+            and_(
+                IngestionJob.status == "running",
+                or_(IngestionJob.heartbeat_at.is_(None), IngestionJob.heartbeat_at < stale),
+            ),
+        ),
+    )
+
+
+def _claim_next_job(owner: str):
+    """
+    Marks the oldest queued job, or a running job whose lease has expired,
+    as running under `owner` and returns (id, file_path), or None when
+    there is nothing to claim. The conditional UPDATE keeps two workers (or
+    two server processes) from claiming the same job.
+    """
+    db = SessionLocal()
+    try:
+        while True:
+            now = datetime.utcnow()
+            job = (
+                db.query(IngestionJob.id, IngestionJob.file_path)
+                .filter(_claimable(now))
+                .order_by(IngestionJob.id)
+                .first()
+            )
+            if job is None:
+                return None
+            claimed = db.execute(
+                update(IngestionJob)
+                .where(IngestionJob.id == job.id, _claimable(now))
+                .values(status="running", progress=10, lease_owner=owner, heartbeat_at=now)
+            ).rowcount
+            db.commit()
+            if claimed:
+                return job.id, job.file_path
+    finally:
+        db.close()
+
+
+def _renew_lease(job_id: int, owner: str) -> bool:
+    db = SessionLocal()
+    try:
+        renewed = db.execute(
+            update(IngestionJob)
+            .where(IngestionJob.id == job_id, _held_by(owner))
+            .values(heartbeat_at=datetime.utcnow())
+        ).rowcount
+        db.commit()
+        return bool(renewed)
+    finally:
+        db.close()
+
+
+def _save_report(job_id: int, owner: str, extracted: dict, statements: list):
+    """
+    Inserts the report and marks the job done in one transaction, provided
+    `owner` still holds the job's lease; otherwise nothing is kept and
+    LeaseLost is raised.
+    """
+    db = SessionLocal()
+    try:
+        job = db.query(IngestionJob).filter(IngestionJob.id == job_id).first()
+        report = build_report(job.company_id, job.year, extracted)
+        company = db.query(Company).filter(Company.id == job.company_id).first()
+        apply_compliance_status([report], {company.id: company})
+        db.add(report)
+        try:
+            db.flush()
+        except IntegrityError:
+            raise ValueError(f"A report for {job.year} already exists.")
+        save_line_items(db, report.id, statements)
+        run_red_flag_sweep(db, [report.id])
+        refresh_company_metrics(db, job.company_id, job.year)
+        # Conditional, so a worker whose lease ran out cannot finish a job
+        # another worker has claimed since.
+        finished = db.execute(
+            update(IngestionJob)
+            .where(IngestionJob.id == job_id, _held_by(owner))
+            .values(report_id=report.id, status="done", progress=100)
+        ).rowcount
+        if not finished:
+            db.rollback()
+            raise LeaseLost(f"lost the lease on ingestion job {job_id}")
+        with span("ingestion.commit"):
+            db.commit()
+        return report.id, job.company_id, job.year
+    finally:
+        db.close()
+
+
+class IngestionWorker:
+    """
+    Drains the ingestion_jobs table in the background. Each claimed job
+    carries a lease that the worker renews while it runs, so several server
+    processes can share the table: a job is only taken over once its
+    owner has stopped renewing it, e.g. after a crash or restart.
+    """
+
+    def __init__(self, extraction_pool, concurrency=INGESTION_CONCURRENCY, poll_interval=INGESTION_POLL_INTERVAL,
+                 search_index=None):
+        self.extraction_pool = extraction_pool
+        self.search_index = search_index
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """Wakes idle workers after a job has been enqueued."""
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                claimed = await run_in_threadpool(_claim_next_job, self.owner)
+                if claimed is None:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                heartbeat = asyncio.create_task(self._heartbeat(claimed[0]))
+                try:
+                    await self.process(*claimed)
+                finally:
+                    heartbeat.cancel()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # A locked database or a dropped connection must not end the
+                # worker. A job left running is claimed again once its lease
+                # goes stale.
+                logger.exception("Ingestion worker error; retrying in %ss", self.poll_interval)
+                await asyncio.sleep(self.poll_interval)
+
+    async def _heartbeat(self, job_id: int):
+        while True:
+            await asyncio.sleep(INGESTION_LEASE_SECONDS / 3)
+            try:
+                if not await run_in_threadpool(_renew_lease, job_id, self.owner):
+                    logger.warning("Lost the lease on ingestion job %s", job_id)
+                    return
+            except Exception:
+                logger.exception("Could not renew the lease on ingestion job %s", job_id)
+
+    async def _update(self, job_id: int, **fields):
+        if not await run_in_threadpool(set_job, job_id, self.owner, **fields):
+            raise LeaseLost(f"lost the lease on ingestion job {job_id}")
+
+    async def process(self, job_id: int, file_path: str):
+        try:
+            extracted = await self.extraction_pool.extract_file(file_path)
+            if not extracted:
+                raise ValueError("Could not extract any financial data. Please check the PDF.")
+            await self._update(job_id, progress=60)
+            statements = await self._parse_line_items(file_path)
+            pages = await self._read_pages(file_path)
+            await self._update(job_id, progress=80)
+            saved = await run_in_threadpool(_save_report, job_id, self.owner, extracted, statements)
+            if pages is not None:
+                await self._index_pages(saved, pages)
+        except asyncio.CancelledError:
+            raise
+        except LeaseLost:
+            # Another worker has the job now; its outcome is that worker's.
+            logger.warning("Lost the lease on ingestion job %s; dropping this run's result", job_id)
+        except ExtractionQueueFull:
+            # The pool is saturated by other callers; hand the job back.
+            await run_in_threadpool(set_job, job_id, self.owner, status="queued", progress=0)
+            await asyncio.sleep(self.poll_interval)
+        except Exception as e:
+            await run_in_threadpool(set_job, job_id, self.owner, status="failed", error=str(e) or type(e).__name__)
+
+    async def _parse_line_items(self, file_path: str) -> list:
+        # Line items are a best-effort extra: a layout the parser cannot
+        # read must not cost the report its headline figures.
+        try:
+            return await self.extraction_pool.run(parse_statements_file, file_path)
+        except ExtractionError:
+            raise
+        except Exception:
+            logger.exception("Could not parse line items from %s", file_path)
+            return []
+
+    async def _read_pages(self, file_path: str):
+        # Page text for the search index is best-effort: not even a busy or
+        # timed-out pool may fail a job whose figures are already in hand.
+        if self.search_index is None:
+            return None
+        try:
+            return await self.extraction_pool.run(page_texts_file, file_path)
+        except Exception:
+            logger.exception("Could not read page text from %s", file_path)
+            return None
+
+    async def _index_pages(self, saved, pages):
+        # The report is committed by now; a failure here leaves it out of
+        # search (python -m app.search picks it up) but the job done.
+        try:
+            await run_in_threadpool(self.search_index.index_report, *saved, pages)
+        except Exception:
+            logger.exception("Could not index report %s for search", saved[0])
@@ -1,29 +1,120 @@
 from fastapi import FastAPI, Request, Form, UploadFile, File, Depends, HTTPException
-from fastapi.responses import RedirectResponse, StreamingResponse
+from fastapi.responses import JSONResponse, RedirectResponse, Response
 from fastapi.templating import Jinja2Templates
+from sqlalchemy import func
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+import asyncio
 from datetime import datetime
+import hashlib
 import os
+import time
 from sqlalchemy.orm import joinedload
+from services.charts import CHART_FORMATS, generate_trend_chart
+from services.compliance import apply_compliance_status, evaluate_report
 from services.pdf_generator import build_review_pdf
-from services.extraction import extract_numbers_from_pdf
-from .database import SessionLocal, engine, Base
-from .models import Company, FinancialReport
+from services.review_cache import ReviewArtifactCache, review_version
+from services.extraction_cache import ExtractionCache
+from services.extraction_pool import ExtractionPool
+from services.storage import FileTooLarge, save_stream
+from services.telemetry import HTTP_REQUESTS, PROFILING_ENABLED, SamplingProfiler, request_timings, server_timing, span
+from .database import engine, get_db
+from .ingestion import IngestionWorker, enqueue_job
+from .metrics import refresh_company_metrics
+from .migrations import upgrade_schema
+from .review_pack import shutdown_shared_executor
+from .models import Company, CompanyMetrics, FinancialReport, IngestionJob
+from .routes import bulk, compliance, jobs, registry, review_pack, search, telemetry
+from .search import search_index
 
-Base.metadata.create_all(bind=engine)
-
-app = FastAPI()
+UPLOAD_DIR = "uploads"
+# Bring the schema up to date on startup. Turn off where a deploy step
+# runs `python -m app.migrations` before the workers start.
+AUTO_MIGRATE = os.getenv("AFRS_AUTO_MIGRATE", "1") == "1"
+# Import the PDF and charting libraries in the background once the
+# server is up, so the first upload or review does not pay for them.
+WARM_UP = os.getenv("AFRS_WARM_UP", "1") == "1"
+
+extraction_pool = ExtractionPool()
+ingestion_worker = IngestionWorker(extraction_pool, search_index=search_index)
+review_cache = ReviewArtifactCache()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if AUTO_MIGRATE:
+        await run_in_threadpool(upgrade_schema, engine)
+    # Opening the cache creates its SQLite file and table, so it is not
+    # done at import.
+    extraction_pool.cache = await run_in_threadpool(ExtractionCache)
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    await ingestion_worker.start()
+    warm_up = asyncio.create_task(run_in_threadpool(_warm_up)) if WARM_UP else None
+    yield
+    if warm_up:
+        await warm_up
+    await ingestion_worker.stop()
+    extraction_pool.shutdown()
+    shutdown_shared_executor()
+
+
+def _warm_up():
+    import fitz  # noqa: F401
+    import matplotlib.backends.backend_agg  # noqa: F401
+    import matplotlib.figure  # noqa: F401
+    import reportlab.pdfgen.canvas  # noqa: F401
+
+
+app = FastAPI(lifespan=lifespan)
+app.state.ingestion_worker = ingestion_worker
+app.include_router(jobs.router)
+app.include_router(bulk.router)
+app.include_router(compliance.router)
+app.include_router(review_pack.router)
+app.include_router(registry.router)
+app.include_router(search.router)
+app.include_router(telemetry.router)
 templates = Jinja2Templates(directory="templates")
 
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-def get_db():
-    db = SessionLocal()
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    """
+    Times every request into the request histogram, labelled by route
+    template, and reports its spans and query time in a Server-Timing
+    header. With AFRS_PROFILING=1, ?profile=1 returns a sampling profile
+    of the request instead of its response.
+    """
+    if PROFILING_ENABLED and request.query_params.get("profile") == "1":
+        return await _profile_request(request, call_next)
+
+    start = time.perf_counter()
+    # A request that raises still counts, as the 500 the client gets.
+    status_code = 500
     try:
-        yield db
+        with request_timings() as timings:
+            response = await call_next(request)
+        status_code = response.status_code
     finally:
-        db.close()
+        elapsed = time.perf_counter() - start
+        route = request.scope.get("route")
+        HTTP_REQUESTS.observe(elapsed, request.method, route.path if route else "unmatched", status_code)
+    response.headers["Server-Timing"] = server_timing(timings, elapsed)
+    return response
+
+
+async def _profile_request(request: Request, call_next):
+    with SamplingProfiler() as profiler:
+        response = await call_next(request)
+        # Streamed bodies are produced while they are read.
+        async for _ in response.body_iterator:
+            pass
+    return Response(
+        profiler.collapsed(),
+        media_type="text/plain",
+        headers={"X-Profile-Samples": str(profiler.samples), "X-Profiled-Status": str(response.status_code)},
+    )
 
 @app.get("/")
 def dashboard(request: Request):
@@ -52,31 +143,92 @@ def add_company(
     db.commit()
     return RedirectResponse("/", status_code=303)
 
+COMPANY_SORTS = {
+    "name": Company.name,
+    "type": Company.company_type,
+    "segment": Company.market_segment,
+}
+
 @app.get("/companies")
-def all_companies(request: Request, db: Session = Depends(get_db)):
-    companies = db.query(Company).all()
-    return templates.TemplateResponse("companies.html", {"request": request, "companies": companies})
+def all_companies(
+    request: Request,
+    page: int = 1,
+    per_page: int = 50,
+    sort: str = "name",
+    order: str = "asc",
+    db: Session = Depends(get_db)
+):
+    page = max(page, 1)
+    per_page = min(max(per_page, 1), 200)
+
+    latest = (
+        db.query(FinancialReport.company_id, func.max(FinancialReport.year).label("latest_year"))
+        .group_by(FinancialReport.company_id)
+        .subquery()
+    )
+    sort_column = latest.c.latest_year if sort == "latest_year" else COMPANY_SORTS.get(sort, Company.name)
+    sort_column = sort_column.desc() if order == "desc" else sort_column.asc()
+
+    total = db.query(func.count(Company.id)).scalar()
+    companies = (
+        db.query(
+            Company.id, Company.name, Company.company_type, Company.market_segment,
+            latest.c.latest_year,
+        )
+        .outerjoin(latest, latest.c.company_id == Company.id)
+        .order_by(sort_column, Company.id)
+        .offset((page - 1) * per_page)
+        .limit(per_page)
+        .all()
+    )
+    return templates.TemplateResponse("companies.html", {
+        "request": request,
+        "companies": companies,
+        "page": page,
+        "per_page": per_page,
+        "pages": max((total + per_page - 1) // per_page, 1),
+        "total": total,
+        "sort": sort,
+        "order": order,
+    })
+
+def _current_year_reports(db: Session, current_year: int):
+    """
+    Companies with the id of their current-year report (None when there is
+    none) and whether its review is completed. Answered from the
+    (year, review_completed, company_id) index.
+    """
+    return (
+        db.query(
+            Company.id, Company.name, Company.company_type,
+            FinancialReport.id.label("report_id"), FinancialReport.review_completed,
+        )
+        .outerjoin(
+            FinancialReport,
+            (FinancialReport.company_id == Company.id) & (FinancialReport.year == current_year),
+        )
+        .order_by(Company.name)
+    )
 
 @app.get("/pending_reviews")
 def pending_reviews(request: Request, db: Session = Depends(get_db)):
     current_year = datetime.now().year
     companies = (
-        db.query(Company)
-        .filter(~Company.financial_reports.any(FinancialReport.year == current_year))
+        _current_year_reports(db, current_year)
+        .filter((FinancialReport.id.is_(None)) | (FinancialReport.review_completed.is_(False)))
         .all()
     )
-    return templates.TemplateResponse("pending_reviews.html", {"request": request, "companies": companies})
+    return templates.TemplateResponse("pending_reviews.html", {"request": request, "companies": companies, "year": current_year})
 
 @app.get("/reviewed_companies")
 def reviewed_companies(request: Request, db: Session = Depends(get_db)):
     current_year = datetime.now().year
     companies = (
-        db.query(Company)
-        .join(FinancialReport)
-        .filter(FinancialReport.year == current_year)
+        _current_year_reports(db, current_year)
+        .filter(FinancialReport.review_completed.is_(True))
         .all()
     )
-    return templates.TemplateResponse("reviewed_companies.html", {"request": request, "companies": companies})
+    return templates.TemplateResponse("reviewed_companies.html", {"request": request, "companies": companies, "year": current_year})
 
 @app.get("/company/{company_id}")
 def company_detail(company_id: int, request: Request, db: Session = Depends(get_db)):
@@ -85,6 +237,36 @@ def company_detail(company_id: int, request: Request, db: Session = Depends(get_
         raise HTTPException(status_code=404, detail="Company not found")
     return templates.TemplateResponse("company_detail.html", {"request": request, "company": company})
 
+def _etags(header: str):
+    return {tag.strip().removeprefix("W/") for tag in header.split(",")}
+
+@app.get("/company/{company_id}/trend")
+def company_trend(company_id: int, request: Request, db: Session = Depends(get_db)):
+    company = db.query(Company).filter(Company.id == company_id).first()
+    if not company:
+        raise HTTPException(status_code=404, detail="Company not found")
+    metrics = db.query(CompanyMetrics).filter(CompanyMetrics.company_id == company_id).order_by(CompanyMetrics.year).all()
+    return templates.TemplateResponse("company_trend.html", {"request": request, "company": company, "metrics": metrics})
+
+@app.get("/company/{company_id}/trend.{fmt}")
+def company_trend_chart(company_id: int, fmt: str, request: Request, db: Session = Depends(get_db)):
+    if fmt not in CHART_FORMATS:
+        raise HTTPException(status_code=404, detail="Unsupported chart format")
+    points = tuple(
+        tuple(row) for row in db.query(
+            CompanyMetrics.year, CompanyMetrics.share_capital, CompanyMetrics.liquid_capital,
+            CompanyMetrics.net_assets, CompanyMetrics.solvency_ratio,
+        ).filter(CompanyMetrics.company_id == company_id).order_by(CompanyMetrics.year)
+    )
+    if not points:
+        raise HTTPException(status_code=404, detail="No reports to chart")
+
+    version = hashlib.sha256(repr((fmt, points)).encode()).hexdigest()[:16]
+    headers = {"ETag": f'"trend-{company_id}-{version}"', "Cache-Control": "private, no-cache"}
+    if headers["ETag"] in _etags(request.headers.get("if-none-match", "")):
+        return Response(status_code=304, headers=headers)
+    return Response(generate_trend_chart(points, fmt), media_type=CHART_FORMATS[fmt], headers=headers)
+
 @app.get("/add_report/{company_id}")
 def add_report_form(company_id: int, request: Request, db: Session = Depends(get_db)):
     company = db.query(Company).filter(Company.id == company_id).first()
@@ -103,40 +285,30 @@ async def add_report(
     if not company:
         raise HTTPException(status_code=404, detail="Company not found")
 
+    existing = db.query(FinancialReport.id).filter(
+        FinancialReport.company_id == company_id, FinancialReport.year == year
+    ).first()
+    if existing:
+        raise HTTPException(status_code=409, detail=f"A report for {year} already exists. Delete it before uploading a new one.")
+
     file_ext = os.path.splitext(file.filename)[1]
     file_path = os.path.join(UPLOAD_DIR, f"{company_id}_{year}{file_ext}")
 
-    file_bytes = await file.read()
-    with open(file_path, "wb") as f:
-        f.write(file_bytes)
-
-    extracted = extract_numbers_from_pdf(file_bytes)
-
-    if not extracted:
-        raise HTTPException(status_code=400, detail="Could not extract any financial data. Please check the PDF.")
-
-    net_assets = extracted.get("net_assets", 0) or (
-        extracted.get("total_assets", 0) - extracted.get("total_liabilities", 0)
-        if extracted.get("total_assets", 0) and extracted.get("total_liabilities", 0)
-        else 0
-    )
-
-    report = FinancialReport(
-        company_id=company_id,
-        year=year,
-        share_capital=extracted.get("share_capital") or 0,
-        liquid_capital=extracted.get("liquid_capital") or 0,
-        net_assets=net_assets,
-        total_liabilities=extracted.get("total_liabilities") or 0,
-        submission_requirements_met=True,
-        publication_requirements_met=True
+    try:
+        with span("upload.save"):
+            await run_in_threadpool(save_stream, file.file, file_path, extraction_pool.max_bytes)
+    except FileTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    job = enqueue_job(db, company_id, year, file_path)
+    ingestion_worker.notify()
+
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": job.id, "status": job.status, "status_url": f"/jobs/{job.id}"},
+        headers={"Location": f"/jobs/{job.id}"},
     )
 
-    db.add(report)
-    db.commit()
-
-    return RedirectResponse(f"/company/{company_id}", status_code=303)
-
 @app.get("/review/{company_id}/{year}")
 def develop_review(company_id: int, year: int, request: Request, db: Session = Depends(get_db)):
     company = db.query(Company).filter(Company.id == company_id).first()
@@ -149,30 +321,7 @@ def develop_review(company_id: int, year: int, request: Request, db: Session = D
     if not report:
         raise HTTPException(status_code=404, detail="Report not found")
 
-    type_checks = {}
-    if company.company_type.lower() == "stockbroker":
-        type_checks["share_capital_req"] = 50_000_000
-        type_checks["liquid_capital_req"] = max(30_000_000, 0.08 * report.total_liabilities)
-    elif company.company_type.lower() == "fund manager":
-        type_checks["share_capital_req"] = 10_000_000
-        type_checks["liquid_capital_req"] = max(5_000_000, 0.08 * report.total_liabilities)
-    elif company.company_type.lower() == "investment bank":
-        type_checks["share_capital_req"] = 250_000_000
-        type_checks["liquid_capital_req"] = max(30_000_000, 0.08 * report.total_liabilities)
-    elif company.company_type.lower() == "issuer":
-        if company.market_segment == "MIMS":
-            type_checks["share_capital_req"] = 50_000_000
-            type_checks["net_assets_req"] = 100_000_000
-        elif company.market_segment == "AIMS":
-            type_checks["share_capital_req"] = 20_000_000
-            type_checks["net_assets_req"] = 20_000_000
-        elif company.market_segment == "GEMS":
-            type_checks["share_capital_req"] = 10_000_000
-            type_checks["net_assets_req"] = 100_000
-
-    solvency_ratio = (
-        report.net_assets / report.total_liabilities if report.total_liabilities else None
-    )
+    type_checks, solvency_ratio, _ = evaluate_report(company, report)
 
     return templates.TemplateResponse(
         "review.html",
@@ -186,7 +335,7 @@ def develop_review(company_id: int, year: int, request: Request, db: Session = D
     )
 
 @app.get("/download_review/{company_id}/{year}")
-def download_review(company_id: int, year: int, db: Session = Depends(get_db)):
+def download_review(company_id: int, year: int, request: Request, db: Session = Depends(get_db)):
     company = db.query(Company).filter(Company.id == company_id).first()
     if not company:
         raise HTTPException(status_code=404, detail="Company not found")
@@ -197,38 +346,21 @@ def download_review(company_id: int, year: int, db: Session = Depends(get_db)):
     if not report:
         raise HTTPException(status_code=404, detail="Report not found")
 
-    type_checks = {}
-    if company.company_type.lower() == "stockbroker":
-        type_checks["share_capital_req"] = 50_000_000
-        type_checks["liquid_capital_req"] = max(30_000_000, 0.08 * report.total_liabilities)
-    elif company.company_type.lower() == "fund manager":
-        type_checks["share_capital_req"] = 10_000_000
-        type_checks["liquid_capital_req"] = max(5_000_000, 0.08 * report.total_liabilities)
-    elif company.company_type.lower() == "investment bank":
-        type_checks["share_capital_req"] = 250_000_000
-        type_checks["liquid_capital_req"] = max(30_000_000, 0.08 * report.total_liabilities)
-    elif company.company_type.lower() == "issuer":
-        if company.market_segment == "MIMS":
-            type_checks["share_capital_req"] = 50_000_000
-            type_checks["net_assets_req"] = 100_000_000
-        elif company.market_segment == "AIMS":
-            type_checks["share_capital_req"] = 20_000_000
-            type_checks["net_assets_req"] = 20_000_000
-        elif company.market_segment == "GEMS":
-            type_checks["share_capital_req"] = 10_000_000
-            type_checks["net_assets_req"] = 100_000
-
-    solvency_ratio = (
-        report.net_assets / report.total_liabilities if report.total_liabilities else 0
-    )
+    type_checks, solvency_ratio, _ = evaluate_report(company, report)
+    solvency_ratio = solvency_ratio or 0
 
-    pdf_bytes = build_review_pdf(company, report, type_checks, solvency_ratio)
+    version = review_version(company, report, type_checks, solvency_ratio)
+    headers = {"ETag": f'"{report.id}-{version}"', "Cache-Control": "private, no-cache"}
+    if headers["ETag"] in _etags(request.headers.get("if-none-match", "")):
+        return Response(status_code=304, headers=headers)
 
-    return StreamingResponse(
-        pdf_bytes,
-        media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename={company.name}_{year}_Review.pdf"}
-    )
+    pdf_bytes = review_cache.get(report.id, version)
+    if pdf_bytes is None:
+        pdf_bytes = build_review_pdf(company, report, type_checks, solvency_ratio).getvalue()
+        review_cache.put(report.id, version, pdf_bytes)
+
+    headers["Content-Disposition"] = f"attachment; filename={company.name}_{year}_Review.pdf"
+    return Response(pdf_bytes, media_type="application/pdf", headers=headers)
 
 @app.post("/delete_report/{report_id}")
 def delete_report(report_id: int, db: Session = Depends(get_db)):
@@ -240,8 +372,15 @@ def delete_report(report_id: int, db: Session = Depends(get_db)):
     if os.path.exists(file_path):
         os.remove(file_path)
 
+    # Jobs keep their history but must not point at the deleted report.
+    db.query(IngestionJob).filter(IngestionJob.report_id == report_id).update(
+        {"report_id": None}, synchronize_session=False
+    )
     db.delete(report)
+    refresh_company_metrics(db, report.company_id, report.year)
     db.commit()
+    review_cache.invalidate(report_id)
+    search_index.remove_report(report_id)
 
     return RedirectResponse(f"/company/{report.company_id}", status_code=303)
 
@@ -262,6 +401,10 @@ def complete_review(
 
     report.submission_requirements_met = submission_requirements_met
     report.publication_requirements_met = publication_requirements_met
+    report.review_completed = True
+    apply_compliance_status([report], {company_id: report.company})
+    refresh_company_metrics(db, company_id, year)
     db.commit()
+    review_cache.invalidate(report.id)
 
     return RedirectResponse(f"/company/{company_id}", status_code=303)
@@ -0,0 +1,79 @@
+"""
+Per-company, per-year metrics behind the trend view. Adding, reviewing or
+deleting a report touches at most two rows: its own year and the next
+reported year, whose growth is measured against it.
+"""
+from sqlalchemy.orm import Session
+from .models import CompanyMetrics, FinancialReport
+
+_FIGURES = ("share_capital", "liquid_capital", "net_assets", "total_liabilities")
+
+
+def _growth(current, previous):
+    if current is None or not previous:
+        return None
+    return (current - previous) / abs(previous)
+
+
+def _fill(metrics: CompanyMetrics, report: FinancialReport, previous):
+    for field in _FIGURES:
+        setattr(metrics, field, getattr(report, field))
+        setattr(metrics, f"{field}_growth", _growth(getattr(report, field), getattr(previous, field, None)))
+    metrics.solvency_ratio = report.solvency_ratio
+    metrics.thresholds_met = report.thresholds_met
+    metrics.solvency_change = (
+        report.solvency_ratio - previous.solvency_ratio
+        if previous is not None and report.solvency_ratio is not None and previous.solvency_ratio is not None
+        else None
+    )
+
+
+def _upsert(db: Session, company_id: int, report: FinancialReport, previous):
+    metrics = db.query(CompanyMetrics).filter(
+        CompanyMetrics.company_id == company_id, CompanyMetrics.year == report.year
+    ).first()
+    if metrics is None:
+        metrics = CompanyMetrics(company_id=company_id, year=report.year)
+        db.add(metrics)
+    _fill(metrics, report, previous)
+
+
+def refresh_company_metrics(db: Session, company_id: int, year: int):
+    """
+    Brings the metrics for `year` and the following reported year in line
+    with the reports as they now stand. Does not commit.
+    """
+    db.flush()
+    reports = db.query(FinancialReport).filter(FinancialReport.company_id == company_id)
+    previous = reports.filter(FinancialReport.year < year).order_by(FinancialReport.year.desc()).first()
+    current = reports.filter(FinancialReport.year == year).first()
+    following = reports.filter(FinancialReport.year > year).order_by(FinancialReport.year).first()
+
+    if current is not None:
+        _upsert(db, company_id, current, previous)
+    else:
+        db.query(CompanyMetrics).filter(
+            CompanyMetrics.company_id == company_id, CompanyMetrics.year == year
+        ).delete(synchronize_session=False)
+    if following is not None:
+        _upsert(db, company_id, following, current or previous)
+
+
+def rebuild_company_metrics(db: Session, company_ids=None):
+    """
+    Recomputes every metrics row of the given companies (all by default)
+    from their reports. Used to backfill; does not commit.
+    """
+    reports = db.query(FinancialReport)
+    existing = db.query(CompanyMetrics)
+    if company_ids is not None:
+        reports = reports.filter(FinancialReport.company_id.in_(company_ids))
+        existing = existing.filter(CompanyMetrics.company_id.in_(company_ids))
+    existing.delete(synchronize_session=False)
+
+    previous = {}
+    for report in reports.order_by(FinancialReport.company_id, FinancialReport.year):
+        metrics = CompanyMetrics(company_id=report.company_id, year=report.year)
+        _fill(metrics, report, previous.get(report.company_id))
+        db.add(metrics)
+        previous[report.company_id] = report
@@ -0,0 +1,113 @@
+"""
+Brings an existing database up to the current models. create_all only
+creates missing tables, so columns and indexes added to existing tables
+since the database was first created are applied here.
+
+The server does this on startup unless AFRS_AUTO_MIGRATE=0; deployments
+that turn that off run it once before starting the workers:
+
+    python -m app.migrations
+"""
+import logging
+from sqlalchemy import and_, inspect, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from services.compliance import apply_compliance_status
+from .database import Base
+from .metrics import rebuild_company_metrics
+from .models import Company, CompanyMetrics, FinancialReport
+
+logger = logging.getLogger(__name__)
+
+# (table, column, DDL type clause) for columns added after the first release.
+_ADDED_COLUMNS = [
+    ("financial_reports", "thresholds_met", "BOOLEAN"),
+    ("financial_reports", "solvency_ratio", "FLOAT"),
+    ("financial_reports", "review_completed", "BOOLEAN NOT NULL DEFAULT FALSE"),
+    ("parsed_statements", "year", "INTEGER"),
+    ("parsed_statements", "column", "INTEGER"),
+    ("ingestion_jobs", "lease_owner", "VARCHAR"),
+    ("ingestion_jobs", "heartbeat_at", "TIMESTAMP"),
+    ("ingestion_jobs", "kind", "VARCHAR NOT NULL DEFAULT 'ingest'"),
+]
+
+# Values given to the rows already there when a column is added. Before
+# review_completed existed a company counted as reviewed once its report
+# was in, so reports from before the upgrade keep that status.
+_ADDED_COLUMN_BACKFILL = {
+    ("financial_reports", "review_completed"): "TRUE",
+}
+
+
+def _add_missing_columns(engine):
+    inspector = inspect(engine)
+    existing = {
+        table: {c["name"] for c in inspector.get_columns(table)}
+        for table in {t for t, _, _ in _ADDED_COLUMNS}
+        if inspector.has_table(table)
+    }
+    quote = engine.dialect.identifier_preparer.quote
+    with engine.begin() as conn:
+        for table, column, ddl in _ADDED_COLUMNS:
+            if table in existing and column not in existing[table]:
+                conn.execute(text(f"ALTER TABLE {quote(table)} ADD COLUMN {quote(column)} {ddl}"))
+                backfill = _ADDED_COLUMN_BACKFILL.get((table, column))
+                if backfill is not None:
+                    conn.execute(text(f"UPDATE {quote(table)} SET {quote(column)} = {backfill}"))
+
+
+def _create_missing_indexes(engine):
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(bind=engine, checkfirst=True)
+            except IntegrityError:
+                logger.warning(
+                    "Could not create unique index %s: the table has duplicate rows. "
+                    "Remove the duplicates and restart to enforce it.", index.name
+                )
+
+
+def _backfill_compliance_status(engine):
+    with Session(engine) as db:
+        reports = db.query(FinancialReport).filter(FinancialReport.thresholds_met.is_(None)).all()
+        if reports:
+            companies = {c.id: c for c in db.query(Company).filter(Company.id.in_({r.company_id for r in reports}))}
+            apply_compliance_status([r for r in reports if r.company_id in companies], companies)
+            db.commit()
+
+
+def _backfill_company_metrics(engine):
+    with Session(engine) as db:
+        missing = (
+            db.query(FinancialReport.company_id)
+            .outerjoin(CompanyMetrics, and_(
+                CompanyMetrics.company_id == FinancialReport.company_id,
+                CompanyMetrics.year == FinancialReport.year,
+            ))
+            .filter(CompanyMetrics.id.is_(None))
+            .distinct()
+        )
+        company_ids = [company_id for company_id, in missing]
+        if company_ids:
+            rebuild_company_metrics(db, company_ids)
+            db.commit()
+
+
+def upgrade_schema(engine):
+    Base.metadata.create_all(bind=engine)
+    _add_missing_columns(engine)
+    _create_missing_indexes(engine)
+    _backfill_compliance_status(engine)
+    _backfill_company_metrics(engine)
+
+
+def main():
+    from .database import engine
+
+    upgrade_schema(engine)
+    print(f"Schema of {engine.url.render_as_string(hide_password=True)} is up to date.")
+
+
+if __name__ == "__main__":
+    main()
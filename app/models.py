@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Date, Boolean
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Date, Boolean, DateTime, Index
 from sqlalchemy.orm import relationship
 from .database import Base
 
@@ -22,6 +23,96 @@ class FinancialReport(Base):
     total_liabilities = Column(Float)
     submission_requirements_met = Column(Boolean)
     publication_requirements_met = Column(Boolean)
-   
+    # Materialised by services.compliance.apply_compliance_status on insert
+    # and on complete_review, so dashboards never recompute them.
+    thresholds_met = Column(Boolean, nullable=True)
+    solvency_ratio = Column(Float, nullable=True)
+    review_completed = Column(Boolean, default=False, nullable=False)
 
     company = relationship("Company", back_populates="financial_reports")
+    parsed_statements = relationship("ParsedStatement", back_populates="report", cascade="all, delete-orphan")
+    red_flags = relationship("RedFlag", back_populates="report", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        Index("ux_financial_reports_company_year", "company_id", "year", unique=True),
+        # Covers the pending/reviewed dashboard lists.
+        Index("ix_financial_reports_year_review", "year", "review_completed", "company_id"),
+    )
+
+
+class CompanyMetrics(Base):
+    """
+    One row per company and reported year, kept up to date by
+    app.metrics.refresh_company_metrics whenever a report changes. Growth
+    and solvency change are against the company's previous reported year.
+    """
+    __tablename__ = "company_metrics"
+    id = Column(Integer, primary_key=True, index=True)
+    company_id = Column(Integer, ForeignKey("companies.id"))
+    year = Column(Integer)
+    share_capital = Column(Float)
+    liquid_capital = Column(Float)
+    net_assets = Column(Float)
+    total_liabilities = Column(Float)
+    solvency_ratio = Column(Float, nullable=True)
+    thresholds_met = Column(Boolean, nullable=True)
+    share_capital_growth = Column(Float, nullable=True)
+    liquid_capital_growth = Column(Float, nullable=True)
+    net_assets_growth = Column(Float, nullable=True)
+    total_liabilities_growth = Column(Float, nullable=True)
+    solvency_change = Column(Float, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ux_company_metrics_company_year", "company_id", "year", unique=True),
+    )
+
+
+class IngestionJob(Base):
+    __tablename__ = "ingestion_jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, default="ingest", nullable=False)  # ingest, review_pack
+    company_id = Column(Integer, ForeignKey("companies.id"))
+    year = Column(Integer)
+    file_path = Column(String)
+    status = Column(String, default="queued", index=True)  # queued, running, done, failed
+    progress = Column(Integer, default=0)
+    error = Column(String, nullable=True)
+    report_id = Column(Integer, ForeignKey("financial_reports.id"), nullable=True)
+    # Lease of the worker running the job, renewed while it runs; a running
+    # job whose heartbeat has gone stale is claimed again.
+    lease_owner = Column(String, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ParsedStatement(Base):
+    __tablename__ = "parsed_statements"
+    id = Column(Integer, primary_key=True, index=True)
+    report_id = Column(Integer, ForeignKey("financial_reports.id"), index=True)
+    statement_type = Column(String)  # Balance Sheet, Income Statement
+    line_item = Column(String)
+    amount = Column(Float)
+    year = Column(Integer, nullable=True)  # of the figure's column, not the filing
+    column = Column(Integer, nullable=True)  # 0 = first figure column
+
+    report = relationship("FinancialReport", back_populates="parsed_statements")
+
+
+class RedFlag(Base):
+    __tablename__ = "red_flags"
+    id = Column(Integer, primary_key=True, index=True)
+    report_id = Column(Integer, ForeignKey("financial_reports.id"), index=True)
+    description = Column(String)
+    severity = Column(String)  # High, Medium
+
+    report = relationship("FinancialReport", back_populates="red_flags")
+
+
+class ParsedFile(Base):
+    __tablename__ = "parsed_files"
+    id = Column(Integer, primary_key=True, index=True)
+    filename = Column(String, unique=True, index=True)
+    parsed_message = Column(String)
+    uploaded_at = Column(DateTime, default=datetime.utcnow)
@@ -1,5 +1,6 @@
 import os
-from app.models import SessionLocal, ParsedFile
+from app.database import SessionLocal
+from app.models import ParsedFile
 
 def parse_file(file_path: str):
     filename = os.path.basename(file_path)
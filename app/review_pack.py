@@ -0,0 +1,322 @@
+"""
+Year-end review packs: the review PDF of every matching report, rendered
+in parallel worker processes and written out as a ZIP archive (one PDF
+per report) or as one combined multi-page PDF with a bookmark per company.
+
+    python -m app.review_pack --year 2025 -o reviews_2025.zip
+    python -m app.review_pack --year 2025 --company-type Issuer --format pdf -o issuers.pdf
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+from sqlalchemy.orm import Session
+from services.compliance import evaluate_report
+from services.extraction_pool import worker_context
+from services.pdf_generator import build_review_pdf
+from .database import SessionLocal
+from .ingestion import set_job
+from .models import Company, FinancialReport, IngestionJob
+
+REVIEW_PACK_WORKERS = int(os.getenv("AFRS_REVIEW_PACK_WORKERS", os.cpu_count() or 1))
+# Packs the server renders at once; further requests get a 429. They all
+# share one pool of REVIEW_PACK_WORKERS processes.
+REVIEW_PACK_MAX_CONCURRENT = int(os.getenv("AFRS_REVIEW_PACK_MAX_CONCURRENT", 2))
+PACK_FORMATS = ("zip", "pdf")
+
+_COMPANY_FIELDS = ("id", "name", "company_type", "market_segment")
+_REPORT_FIELDS = (
+    "id", "year", "share_capital", "liquid_capital", "net_assets", "total_liabilities",
+    "submission_requirements_met", "publication_requirements_met",
+)
+
+
+def select_reviews(db: Session, years=None, company_type=None, company_ids=None):
+    """
+    Returns one (company, report) pair of plain namespaces per matching
+    report, ordered by year and company name. Plain values rather than ORM
+    rows so they can be sent to worker processes.
+    """
+    query = db.query(
+        *(getattr(Company, f) for f in _COMPANY_FIELDS),
+        *(getattr(FinancialReport, f) for f in _REPORT_FIELDS),
+    ).join(Company, Company.id == FinancialReport.company_id)
+    if years:
+        query = query.filter(FinancialReport.year.in_(years))
+    if company_type:
+        query = query.filter(Company.company_type == company_type)
+    if company_ids:
+        query = query.filter(Company.id.in_(company_ids))
+
+    split = len(_COMPANY_FIELDS)
+    return [
+        (
+            SimpleNamespace(**dict(zip(_COMPANY_FIELDS, row[:split]))),
+            SimpleNamespace(company_id=row[0], **dict(zip(_REPORT_FIELDS, row[split:]))),
+        )
+        for row in query.order_by(FinancialReport.year, Company.name, Company.id)
+    ]
+
+
+def _render(company, report) -> bytes:
+    type_checks, solvency_ratio, _ = evaluate_report(company, report)
+    return build_review_pdf(company, report, type_checks, solvency_ratio or 0).getvalue()
+
+
+_pack_slots = threading.BoundedSemaphore(REVIEW_PACK_MAX_CONCURRENT)
+_shared_executor = None
+_shared_lock = threading.Lock()
+
+
+def acquire_pack_slot() -> bool:
+    """
+    Takes one of the REVIEW_PACK_MAX_CONCURRENT slots for a server-side
+    pack, or returns False when all are in use. release_pack_slot gives it
+    back.
+    """
+    return _pack_slots.acquire(blocking=False)
+
+
+def release_pack_slot():
+    _pack_slots.release()
+
+
+def shared_executor():
+    """
+    The process pool every server-side pack renders in, so concurrent
+    requests never start more than REVIEW_PACK_WORKERS processes between
+    them. The CLI uses a pool of its own.
+    """
+    global _shared_executor
+    with _shared_lock:
+        if _shared_executor is None:
+            _shared_executor = ProcessPoolExecutor(max_workers=REVIEW_PACK_WORKERS, mp_context=worker_context())
+        return _shared_executor
+
+
+def shutdown_shared_executor():
+    global _shared_executor
+    with _shared_lock:
+        if _shared_executor is not None:
+            _shared_executor.shutdown(wait=False, cancel_futures=True)
+            _shared_executor = None
+
+
+def render_reviews(reviews, workers=REVIEW_PACK_WORKERS, progress=None, executor=None):
+    """
+    Yields (company, report, pdf_bytes) in the order given. At most a few
+    renders per worker are in flight, so memory stays flat however many
+    reviews there are. progress(done, total) is called after each one.
+    Renders in `executor` when given, else in a pool of its own.
+    """
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=worker_context())
+    in_flight = deque()
+    pending = iter(reviews)
+    done = 0
+    try:
+        for company, report in pending:
+            in_flight.append((company, report, executor.submit(_render, company, report)))
+            if len(in_flight) >= workers * 2:
+                break
+        while in_flight:
+            company, report, future = in_flight.popleft()
+            next_review = next(pending, None)
+            if next_review is not None:
+                in_flight.append((*next_review, executor.submit(_render, *next_review)))
+            pdf_bytes = future.result()
+            done += 1
+            if progress:
+                progress(done, len(reviews))
+            yield company, report, pdf_bytes
+    finally:
+        if own_executor:
+            executor.shutdown(cancel_futures=True)
+        else:
+            for _, _, future in in_flight:
+                future.cancel()
+
+
+def review_filename(company, report) -> str:
+    name = re.sub(r"[^\w.-]+", "_", company.name).strip("_")
+    return f"{report.year}/{name}_{report.year}_Review.pdf"
+
+
+class _ChunkWriter:
+    # Unseekable sink for ZipFile; the caller drains it between entries.
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def stream_zip(rendered):
+    """
+    Yields a ZIP archive of rendered reviews chunk by chunk, one entry per
+    review, without holding the whole archive.
+    """
+    sink = _ChunkWriter()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as archive:
+        for company, report, pdf_bytes in rendered:
+            archive.writestr(review_filename(company, report), pdf_bytes)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def stream_combined_pdf(rendered, chunk_size=1024 * 1024):
+    """
+    Yields one PDF with every rendered review in order, bookmarked by
+    company and year. Each review is appended to a temporary file with an
+    incremental save as soon as it is rendered, and the bytes that save
+    added are sent straight away: an incremental save never rewrites what
+    is already in the file. Only the review being appended is in memory.
+    """
+    import fitz  # PyMuPDF
+
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    toc = []
+    pages = 0
+    sent = 0
+
+    def appended():
+        nonlocal sent
+        with open(path, "rb") as f:
+            f.seek(sent)
+            while chunk := f.read(chunk_size):
+                sent += len(chunk)
+                yield chunk
+
+    try:
+        for company, report, pdf_bytes in rendered:
+            toc.append([1, f"{company.name} - {report.year}", pages + 1])
+            if not pages:
+                # The first review is the base document the others are added to.
+                with open(path, "wb") as f:
+                    f.write(pdf_bytes)
+                with fitz.open(path) as pack:
+                    pages = pack.page_count
+            else:
+                with fitz.open(path) as pack, fitz.open(stream=pdf_bytes, filetype="pdf") as review:
+                    pack.insert_pdf(review)
+                    pages = pack.page_count
+                    pack.saveIncr()
+            yield from appended()
+        if toc:
+            with fitz.open(path) as pack:
+                pack.set_toc(toc)
+                pack.saveIncr()
+            yield from appended()
+    finally:
+        os.remove(path)
+
+
+def stream_pack(reviews, fmt="zip", workers=REVIEW_PACK_WORKERS, progress=None, executor=None):
+    rendered = render_reviews(reviews, workers, progress, executor)
+    return stream_zip(rendered) if fmt == "zip" else stream_combined_pdf(rendered)
+
+
+def create_pack_job(db: Session) -> int:
+    """
+    A job row for a pack being streamed, so its progress can be followed
+    at /jobs/{id} like an upload's. The ingestion worker ignores it.
+    """
+    job = IngestionJob(kind="review_pack", status="running", progress=0)
+    db.add(job)
+    db.commit()
+    return job.id
+
+
+def track_pack(stream, job_id: int, release=None):
+    """
+    Passes a stream_pack stream through and finishes its job: done once
+    the last chunk is out, failed if rendering breaks off or the stream is
+    closed early. The returned generator is already started, so it
+    finishes the job (and calls release) even when it is closed, or
+    garbage collected, before its first chunk is read. Use
+    job_progress(job_id) as the stream's progress callback.
+    """
+    tracked = _track_pack(stream, job_id, release)
+    next(tracked)
+    return tracked
+
+
+def _track_pack(stream, job_id, release):
+    fields = {"status": "failed", "error": "Download cancelled."}
+    try:
+        yield  # reached by track_pack; chunks follow
+        yield from stream
+        fields = {"status": "done", "progress": 100}
+    except GeneratorExit:
+        raise
+    except Exception as e:
+        fields = {"status": "failed", "error": str(e) or type(e).__name__}
+        raise
+    finally:
+        stream.close()
+        try:
+            set_job(job_id, **fields)
+        finally:
+            if release:
+                release()
+
+
+def job_progress(job_id: int):
+    # Writes only when the percentage moves; 100 waits for the last byte.
+    last = -1
+
+    def progress(done, total):
+        nonlocal last
+        percent = min(99, done * 100 // total)
+        if percent != last:
+            last = percent
+            set_job(job_id, progress=percent)
+    return progress
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render a review pack.")
+    parser.add_argument("--year", type=int, action="append", help="report year (repeatable)")
+    parser.add_argument("--company-type", help="only companies of this type")
+    parser.add_argument("--company-id", type=int, action="append", help="only this company (repeatable)")
+    parser.add_argument("--format", choices=PACK_FORMATS, default="zip")
+    parser.add_argument("--workers", type=int, default=REVIEW_PACK_WORKERS)
+    parser.add_argument("-o", "--output", required=True)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        reviews = select_reviews(db, args.year, args.company_type, args.company_id)
+    finally:
+        db.close()
+    if not reviews:
+        sys.exit("No reports match.")
+
+    def progress(done, total):
+        print(f"\rrendered {done}/{total}", end="", file=sys.stderr, flush=True)
+
+    with open(args.output, "wb") as out:
+        for chunk in stream_pack(reviews, args.format, args.workers, progress):
+            out.write(chunk)
+    print(f"\nwrote {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import os
+import tempfile
+import zipfile
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, UploadFile
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from services.storage import FileTooLarge, save_stream
+from ..bulk_import import MAX_ZIP_BYTES, enqueue_zip
+from ..database import get_db
+
+router = APIRouter()
+
+
+def _save_upload(file: UploadFile) -> str:
+    fd, path = tempfile.mkstemp(suffix=".zip")
+    os.close(fd)
+    try:
+        save_stream(file.file, path, MAX_ZIP_BYTES)
+    except FileTooLarge:
+        os.remove(path)
+        raise
+    return path
+
+
+@router.post("/bulk_import")
+async def bulk_import(
+    request: Request,
+    file: UploadFile = File(...),
+    year: int = Form(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Queues an ingestion job for every PDF in an uploaded ZIP archive and
+    returns them at once; each job's status_url reports its progress, as
+    for a single upload. See app.bulk_import for how files are matched to
+    companies.
+    """
+    if not file.filename.lower().endswith(".zip"):
+        raise HTTPException(status_code=400, detail="Please upload a ZIP archive.")
+
+    try:
+        zip_path = await run_in_threadpool(_save_upload, file)
+    except FileTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    try:
+        result = await run_in_threadpool(enqueue_zip, db, zip_path, year)
+    except zipfile.BadZipFile as e:
+        raise HTTPException(status_code=400, detail=f"Invalid ZIP archive: {e}")
+    finally:
+        os.remove(zip_path)
+
+    if result["jobs"]:
+        request.app.state.ingestion_worker.notify()
+    return JSONResponse(status_code=202, content=result)
@@ -0,0 +1,51 @@
+import math
+from typing import Optional
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from services.compliance import evaluate_batch
+from ..database import get_db
+from ..models import Company, FinancialReport
+
+router = APIRouter()
+
+
+def _json_number(value):
+    return None if math.isnan(value) else value
+
+
+@router.get("/compliance")
+def compliance_sweep(year: Optional[int] = None, company_type: Optional[str] = None, db: Session = Depends(get_db)):
+    """
+    Evaluates every matching report against the regulatory thresholds in
+    one batch and returns a row per report.
+    """
+    query = db.query(
+        FinancialReport.id, FinancialReport.company_id, Company.name, FinancialReport.year,
+        Company.company_type, Company.market_segment,
+        FinancialReport.share_capital, FinancialReport.liquid_capital,
+        FinancialReport.net_assets, FinancialReport.total_liabilities,
+    ).join(Company, Company.id == FinancialReport.company_id)
+    if year is not None:
+        query = query.filter(FinancialReport.year == year)
+    if company_type:
+        query = query.filter(Company.company_type == company_type)
+    rows = query.order_by(FinancialReport.year, Company.name).all()
+    if not rows:
+        return []
+
+    columns = list(zip(*rows))
+    result = evaluate_batch(*columns[4:])
+    numbers = [key for key in result if not key.endswith("_met")]
+    flags = [key for key in result if key.endswith("_met")]
+
+    return [
+        {
+            "report_id": row[0],
+            "company_id": row[1],
+            "company_name": row[2],
+            "year": row[3],
+            **{key: _json_number(result[key][i].item()) for key in numbers},
+            **{key: bool(result[key][i]) for key in flags},
+        }
+        for i, row in enumerate(rows)
+    ]
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from ..database import get_db
+from ..models import IngestionJob
+
+router = APIRouter()
+
+
+def job_status(job: IngestionJob) -> dict:
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "company_id": job.company_id,
+        "year": job.year,
+        "status": job.status,
+        "progress": job.progress,
+        "error": job.error,
+        "report_id": job.report_id,
+        "status_url": f"/jobs/{job.id}",
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+    }
+
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: int, db: Session = Depends(get_db)):
+    job = db.query(IngestionJob).filter(IngestionJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_status(job)
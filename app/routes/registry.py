@@ -0,0 +1,85 @@
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from ..database import get_db
+from ..export import (
+    DATASETS, EXPORT_FORMATS, company_dicts, company_query, parquet_available, report_dicts, report_query,
+    stream_export,
+)
+from ..models import Company, FinancialReport
+
+router = APIRouter()
+
+
+def _page(db, query, key, after, limit, to_dicts):
+    # Keyset pagination: rows after the last id seen, one extra to tell
+    # whether another page follows. Every page is an index range scan,
+    # however deep into the registry it is.
+    rows = db.execute(query.where(key > after).limit(limit + 1)).all()
+    items = to_dicts(rows[:limit])
+    return {"items": items, "next_after": rows[limit - 1][0] if len(rows) > limit else None}
+
+
+@router.get("/api/companies")
+def list_companies(
+    company_type: Optional[str] = None,
+    market_segment: Optional[str] = None,
+    after: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+):
+    """
+    Companies in id order, a page at a time. Pass the page's next_after as
+    after to get the next page; it is null on the last one.
+    """
+    return _page(db, company_query(company_type, market_segment), Company.id, after, limit, company_dicts)
+
+
+@router.get("/api/reports")
+def list_reports(
+    year: List[int] = Query([]),
+    company_id: List[int] = Query([]),
+    company_type: Optional[str] = None,
+    market_segment: Optional[str] = None,
+    after: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+):
+    """
+    Financial reports in id order with their company and computed
+    compliance fields, paged like /api/companies.
+    """
+    query = report_query(year, company_id, company_type, market_segment)
+    return _page(db, query, FinancialReport.id, after, limit, report_dicts)
+
+
+@router.get("/export/{dataset}.{fmt}")
+def export(
+    dataset: str,
+    fmt: str,
+    year: List[int] = Query([]),
+    company_id: List[int] = Query([]),
+    company_type: Optional[str] = None,
+    market_segment: Optional[str] = None,
+):
+    """
+    Streams the whole registry, companies or reports with their compliance
+    fields, as CSV, JSON Lines or Parquet. Rows are read and sent in chunks,
+    so memory use does not grow with the registry.
+    """
+    if dataset not in DATASETS:
+        raise HTTPException(status_code=404, detail=f"dataset must be one of {', '.join(DATASETS)}")
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=404, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    if fmt == "parquet" and not parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet export needs pyarrow installed on the server.")
+
+    filters = {"company_type": company_type, "market_segment": market_segment}
+    if dataset == "reports":
+        filters.update(years=year, company_ids=company_id)
+    return StreamingResponse(
+        stream_export(dataset, fmt, filters),
+        media_type=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename={dataset}.{fmt}"},
+    )
@@ -0,0 +1,55 @@
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from ..database import get_db
+from ..review_pack import (
+    PACK_FORMATS, acquire_pack_slot, create_pack_job, job_progress, release_pack_slot, select_reviews,
+    shared_executor, stream_pack, track_pack,
+)
+
+router = APIRouter()
+
+
+@router.get("/review_pack")
+def review_pack(
+    year: List[int] = Query([]),
+    company_type: Optional[str] = None,
+    company_id: List[int] = Query([]),
+    format: str = "zip",
+    db: Session = Depends(get_db)
+):
+    """
+    Streams the review PDFs of every matching report as a ZIP archive or,
+    with format=pdf, as one combined PDF. X-Review-Count gives the number
+    of reviews in the pack up front; the job at X-Job-Status-URL follows
+    the rendering while the pack downloads.
+    """
+    if format not in PACK_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(PACK_FORMATS)}")
+
+    reviews = select_reviews(db, year, company_type, company_id)
+    if not reviews:
+        raise HTTPException(status_code=404, detail="No reports match.")
+
+    if not acquire_pack_slot():
+        raise HTTPException(status_code=429, detail="Too many review packs are being rendered. Try again shortly.")
+    try:
+        job_id = create_pack_job(db)
+        stream = stream_pack(reviews, format, progress=job_progress(job_id), executor=shared_executor())
+        body = track_pack(stream, job_id, release=release_pack_slot)
+    except BaseException:
+        release_pack_slot()
+        raise
+
+    label = "_".join(str(y) for y in sorted(set(year))) or "all"
+    return StreamingResponse(
+        body,
+        media_type="application/zip" if format == "zip" else "application/pdf",
+        headers={
+            "Content-Disposition": f"attachment; filename=review_pack_{label}.{format}",
+            "X-Review-Count": str(len(reviews)),
+            "X-Job-Id": str(job_id),
+            "X-Job-Status-URL": f"/jobs/{job_id}",
+        },
+    )
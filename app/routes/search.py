@@ -0,0 +1,31 @@
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from services.search_index import SearchQueryError
+from ..database import get_db
+from ..search import search_filings
+
+router = APIRouter()
+
+
+@router.get("/search")
+def search(
+    q: str = Query(..., min_length=1),
+    company_id: List[int] = Query([]),
+    company_type: Optional[str] = None,
+    market_segment: Optional[str] = None,
+    year: List[int] = Query([]),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+):
+    """
+    Searches the text of every ingested filing. q is an FTS5 query: words,
+    "quoted phrases", OR, NOT, and prefix* terms. Returns the best-matching
+    pages first, each with a snippet in which matches are wrapped in <mark>.
+    """
+    try:
+        hits = search_filings(db, q, company_id, company_type, market_segment, year, limit, offset)
+    except SearchQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"query": q, "limit": limit, "offset": offset, "results": hits}
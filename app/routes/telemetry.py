@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from services.telemetry import render_metrics
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics():
+    """
+    Request, stage and query latency histograms in the Prometheus text
+    format. Each server process reports its own.
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,129 @@
+"""
+Full-text search over the page text of every filing. New reports are
+indexed as they are ingested; this tool indexes the filings already on
+disk (under uploads/, where single and bulk uploads are stored) that the
+index does not have yet, or with --rebuild all of them again.
+
+    python -m app.search
+    python -m app.search --rebuild --workers 8
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy.orm import Session
+from services.extraction_pool import worker_context
+from services.search_index import SearchIndex, page_texts_file
+from .database import SessionLocal
+from .models import Company, FinancialReport, IngestionJob
+
+UPLOAD_DIR = "uploads"
+BATCH_SIZE = 50
+
+search_index = SearchIndex()
+
+
+def search_filings(db: Session, query: str, company_ids=None, company_type=None, market_segment=None,
+                   years=None, limit=20, offset=0, index=search_index) -> list:
+    """
+    Ranked page hits for an FTS5 query, with the company name added.
+    Company type and segment are resolved to company ids here; the search
+    itself only reads the index.
+    """
+    if company_type or market_segment:
+        companies = db.query(Company.id)
+        if company_ids:
+            companies = companies.filter(Company.id.in_(company_ids))
+        if company_type:
+            companies = companies.filter(Company.company_type == company_type)
+        if market_segment:
+            companies = companies.filter(Company.market_segment == market_segment)
+        company_ids = [cid for cid, in companies]
+        if not company_ids:
+            return []
+
+    hits = index.search(query, company_ids or None, years or None, limit, offset)
+    names = dict(db.query(Company.id, Company.name).filter(Company.id.in_({h["company_id"] for h in hits})))
+    for hit in hits:
+        hit["company_name"] = names.get(hit["company_id"])
+    return hits
+
+
+def _filing_paths(db: Session, reports):
+    """
+    (report_id, company_id, year, path) for each report whose PDF is on
+    disk: the file its ingestion job read, else the stored upload name.
+    """
+    job_files = dict(
+        db.query(IngestionJob.report_id, IngestionJob.file_path).filter(IngestionJob.report_id.isnot(None))
+    )
+    found = []
+    for report_id, company_id, year in reports:
+        for path in (job_files.get(report_id), os.path.join(UPLOAD_DIR, f"{company_id}_{year}.pdf")):
+            if path and os.path.exists(path):
+                found.append((report_id, company_id, year, path))
+                break
+    return found
+
+
+def build_index(db: Session, rebuild=False, workers=os.cpu_count() or 1, index=search_index, progress=None) -> dict:
+    """
+    Reads and indexes the filings the index is missing (all of them with
+    rebuild), in parallel worker processes. Returns counts of reports
+    indexed and of reports whose PDF could not be found or read.
+    """
+    if rebuild:
+        index.clear()
+    indexed = index.indexed_report_ids()
+    reports = [r for r in db.query(FinancialReport.id, FinancialReport.company_id, FinancialReport.year)
+               if r[0] not in indexed]
+    filings = _filing_paths(db, reports)
+
+    done = 0
+    failed = []
+    batch = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=worker_context()) as executor:
+        futures = [(filing, executor.submit(page_texts_file, filing[3])) for filing in filings]
+        for (report_id, company_id, year, path), future in futures:
+            try:
+                batch.append((report_id, company_id, year, future.result()))
+            except Exception as e:
+                failed.append({"file": path, "reason": str(e)})
+                continue
+            if len(batch) >= BATCH_SIZE:
+                index.index_reports(batch)
+                done += len(batch)
+                batch.clear()
+                if progress:
+                    progress(done, len(filings))
+    if batch:
+        index.index_reports(batch)
+        done += len(batch)
+    if done:
+        index.optimize()
+    return {"indexed": done, "missing": len(reports) - len(filings), "failed": failed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the full-text search index.")
+    parser.add_argument("--rebuild", action="store_true", help="re-index every filing")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    def progress(done, total):
+        print(f"\rindexed {done}/{total}", end="", file=sys.stderr, flush=True)
+
+    db = SessionLocal()
+    try:
+        result = build_index(db, args.rebuild, args.workers, progress=progress)
+    finally:
+        db.close()
+    print(file=sys.stderr)
+
+    for item in result["failed"]:
+        print(f"failed    {item['file']}: {item['reason']}")
+    print(f"{result['indexed']} indexed, {result['missing']} without a PDF on disk, {len(result['failed'])} failed")
+
+
+if __name__ == "__main__":
+    main()
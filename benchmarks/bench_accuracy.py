@@ -0,0 +1,328 @@
+"""
+Accuracy and throughput regression run for services.extraction. Builds a
+corpus of synthetic filings with ReportLab (layouts, unit scales, note
+columns and report lengths the heuristics have to cope with), adds the
+sample filing, and runs extract_numbers_from_pdf over each document in a
+fresh worker process. Reports per-document latency, pages per second,
+peak RSS and field-level accuracy, and exits non-zero when accuracy or
+throughput falls below the thresholds or regresses against a saved run.
+
+    python -m benchmarks.bench_accuracy
+    python -m benchmarks.bench_accuracy --save bench_baseline.json
+    python -m benchmarks.bench_accuracy --baseline bench_baseline.json --max-slowdown 0.2
+    python -m benchmarks.bench_accuracy --keep-fixtures fixtures/
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+from services.extraction import extract_numbers_from_pdf
+
+SAMPLE_PDF = "data/raw/Olympia Capital Holdings Limited - AUDITED FINANCIALS.pdf"
+# Read off the sample's statement of financial position (KShs '000).
+# Its liquid capital is not stated, so it is not scored.
+SAMPLE_EXPECTED = {
+    "share_capital": 200000000.0,
+    "net_assets": 1693877000.0,
+    "total_liabilities": 223686000.0,
+    "total_assets": 1917563000.0,
+}
+
+SCALES = {"KShs": 1, "KShs '000": 1000, "KShs millions": 1000000}
+_NARRATIVE = ("The directors present their report together with the audited financial statements "
+              "for the year, which show the state of affairs of the company and of its operations. ")
+
+
+def _figures(current, prior=None):
+    """
+    Balance sheet figures (in the units printed) for the current year, and
+    the comparative year (10% lower unless given).
+    """
+    prior = prior or {k: round(v * 0.9) for k, v in current.items()}
+    return current, prior
+
+
+# Each fixture is one filing: its balance sheet figures in printed units,
+# the unit heading, whether a Notes column sits between labels and
+# figures, and how many narrative pages surround the statement.
+FIXTURES = [
+    {"name": "thousands", "unit": "KShs '000", "notes": False, "pages": 1,
+     "figures": _figures({"ppe": 801330, "inventories": 123624, "receivables": 87634, "cash": 112988,
+                          "share_capital": 200000, "retained": 455130, "borrowings": 88939, "payables": 51322})},
+    {"name": "units", "unit": "KShs", "notes": False, "pages": 1,
+     "figures": _figures({"ppe": 48213577, "inventories": 6123481, "receivables": 3872914, "cash": 2419356,
+                          "share_capital": 12500000, "retained": 31236514, "borrowings": 9146322, "payables": 7746492})},
+    {"name": "millions", "unit": "KShs millions", "notes": False, "pages": 1,
+     "figures": _figures({"ppe": 8413, "inventories": 1271, "receivables": 968, "cash": 754,
+                          "share_capital": 1500, "retained": 6329, "borrowings": 2144, "payables": 1433})},
+    {"name": "note_column", "unit": "KShs '000", "notes": True, "pages": 1,
+     "figures": _figures({"ppe": 264118, "inventories": 41273, "receivables": 38816, "cash": 19442,
+                          "share_capital": 75000, "retained": 230177, "borrowings": 33960, "payables": 24512})},
+    {"name": "prior_year_larger", "unit": "KShs '000", "notes": False, "pages": 1,
+     "figures": _figures(
+         {"ppe": 512773, "inventories": 61440, "receivables": 52118, "cash": 30871,
+          "share_capital": 150000, "retained": 394205, "borrowings": 71266, "payables": 41731},
+         {"ppe": 633018, "inventories": 77102, "receivables": 64877, "cash": 48226,
+          "share_capital": 150000, "retained": 550912, "borrowings": 70418, "payables": 51893})},
+    {"name": "annual_report_80p", "unit": "KShs '000", "notes": False, "pages": 80,
+     "figures": _figures({"ppe": 1273655, "inventories": 213407, "receivables": 187322, "cash": 96518,
+                          "share_capital": 500000, "retained": 926584, "borrowings": 201947, "payables": 142371})},
+    {"name": "annual_report_300p", "unit": "KShs '000", "notes": True, "pages": 300,
+     "figures": _figures({"ppe": 3715290, "inventories": 402176, "receivables": 611843, "cash": 284537,
+                          "share_capital": 1200000, "retained": 2815716, "borrowings": 617448, "payables": 380682})},
+]
+
+
+def _statement(figures):
+    """
+    (label, note, amount) rows of a balance sheet and its totals, computed
+    from the line items so every fixture adds up.
+    """
+    f = dict(figures)
+    f["current_assets"] = f["inventories"] + f["receivables"] + f["cash"]
+    f["total_assets"] = f["ppe"] + f["current_assets"]
+    f["equity"] = f["share_capital"] + f["retained"]
+    f["total_liabilities"] = f["borrowings"] + f["payables"]
+    return f, [
+        ("ASSETS", None, None),
+        ("Non-current assets", None, None),
+        ("Property, plant and equipment", "12", f["ppe"]),
+        ("Current assets", None, None),
+        ("Inventories", "14", f["inventories"]),
+        ("Trade and other receivables", "15", f["receivables"]),
+        ("Bank and cash balances", "16", f["cash"]),
+        ("", None, f["current_assets"]),
+        ("Total assets", None, f["total_assets"]),
+        ("EQUITY AND LIABILITIES", None, None),
+        ("Share capital", "18", f["share_capital"]),
+        ("Retained earnings", None, f["retained"]),
+        ("Total equity", None, f["equity"]),
+        ("Non-current liabilities", None, None),
+        ("Borrowings", "20", f["borrowings"]),
+        ("Current liabilities", None, None),
+        ("Trade and other payables", "21", f["payables"]),
+        ("Total liabilities", None, f["total_liabilities"]),
+        ("Total equity and liabilities", None, f["equity"] + f["total_liabilities"]),
+    ]
+
+
+def expected_values(fixture) -> dict:
+    current, _ = fixture["figures"]
+    f, _ = _statement(current)
+    scale = SCALES[fixture["unit"]]
+    return {
+        "share_capital": float(f["share_capital"] * scale),
+        "liquid_capital": float((f["current_assets"] - f["inventories"]) * scale),
+        "net_assets": float(f["equity"] * scale),
+        "total_liabilities": float(f["total_liabilities"] * scale),
+        "total_assets": float(f["total_assets"] * scale),
+    }
+
+
+def _narrative_page(c, number):
+    text = c.beginText(50, A4[1] - 60)
+    text.setFont("Helvetica", 9)
+    words = (_NARRATIVE * 40).split()
+    for start in range(0, len(words), 16):
+        text.textLine(" ".join(words[start:start + 16]))
+    c.drawText(text)
+    c.drawString(A4[0] / 2, 30, str(number))
+    c.showPage()
+
+
+def write_fixture(fixture, path):
+    """
+    Writes the fixture's filing: narrative pages with the statement of
+    financial position in the middle.
+    """
+    current, prior = fixture["figures"]
+    _, current_rows = _statement(current)
+    _, prior_rows = _statement(prior)
+    c = canvas.Canvas(path, pagesize=A4, invariant=1)
+    statement_page = (fixture["pages"] - 1) // 2
+    for number in range(fixture["pages"]):
+        if number != statement_page:
+            _narrative_page(c, number + 1)
+            continue
+        y = A4[1] - 60
+        c.setFont("Helvetica-Bold", 11)
+        c.drawString(50, y, f"{fixture['name'].upper().replace('_', ' ')} LIMITED")
+        c.drawString(50, y - 16, "STATEMENT OF FINANCIAL POSITION AS AT 31 DECEMBER 2024")
+        y -= 50
+        c.setFont("Helvetica-Bold", 9)
+        if fixture["notes"]:
+            c.drawRightString(350, y, "Notes")
+        c.drawRightString(450, y, "2024")
+        c.drawRightString(530, y, "2023")
+        c.drawRightString(450, y - 11, fixture["unit"])
+        c.drawRightString(530, y - 11, fixture["unit"])
+        y -= 30
+        for (label, note, amount), (_, _, previous) in zip(current_rows, prior_rows):
+            c.setFont("Helvetica-Bold" if amount is None or not label else "Helvetica", 9)
+            c.drawString(50, y, label)
+            if fixture["notes"] and note:
+                c.drawRightString(350, y, note)
+            if amount is not None:
+                c.drawRightString(450, y, f"{amount:,}")
+                c.drawRightString(530, y, f"{previous:,}")
+            y -= 15
+        c.showPage()
+    c.save()
+
+
+def _measure(path, repeat):
+    """
+    Runs in a fresh worker process: best-of-`repeat` extraction time, the
+    result, and the process's peak RSS in KiB.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = extract_numbers_from_pdf(data)
+        best = min(best, time.perf_counter() - start)
+    peak_rss_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak_rss_kib //= 1024
+    return best, result, peak_rss_kib
+
+
+def _page_count(path) -> int:
+    import fitz
+
+    with fitz.open(path) as doc:
+        return doc.page_count
+
+
+def _correct(actual, expected) -> bool:
+    return math.isclose(actual, expected, rel_tol=1e-9, abs_tol=0.5)
+
+
+def run(documents, repeat):
+    """
+    documents: (name, path, expected) triples. Returns a dict per document.
+    """
+    rows = []
+    # A freshly spawned worker per document, so each peak RSS is that
+    # document's and not inherited from this process.
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context, max_tasks_per_child=1) as executor:
+        for name, path, expected in documents:
+            seconds, result, peak_rss_kib = executor.submit(_measure, path, repeat).result()
+            pages = _page_count(path)
+            scored = {field: _correct(result[field], value) for field, value in expected.items()}
+            rows.append({
+                "name": name,
+                "pages": pages,
+                "seconds": seconds,
+                "pages_per_second": pages / seconds,
+                "peak_rss_mib": peak_rss_kib / 1024,
+                "correct": sum(scored.values()),
+                "scored": len(scored),
+                "right": sorted(field for field, ok in scored.items() if ok),
+                "wrong": {field: {"expected": expected[field], "actual": result[field]}
+                          for field, ok in scored.items() if not ok},
+            })
+    return rows
+
+
+def summarise(rows) -> dict:
+    pages = sum(r["pages"] for r in rows)
+    seconds = sum(r["seconds"] for r in rows)
+    return {
+        "documents": len(rows),
+        "pages": pages,
+        "pages_per_second": pages / seconds,
+        "accuracy": sum(r["correct"] for r in rows) / sum(r["scored"] for r in rows),
+        "peak_rss_mib": max(r["peak_rss_mib"] for r in rows),
+        # Only fields with an expected value; unscored ones prove nothing.
+        "correct_fields": sorted(f"{r['name']}:{field}" for r in rows for field in r["right"]),
+    }
+
+
+def regressions(summary, args, baseline=None) -> list:
+    failures = []
+    if summary["accuracy"] < args.min_accuracy:
+        failures.append(f"accuracy {summary['accuracy']:.1%} is below {args.min_accuracy:.1%}")
+    if summary["pages_per_second"] < args.min_pages_per_second:
+        failures.append(f"{summary['pages_per_second']:.0f} pages/s is below {args.min_pages_per_second:.0f}")
+    if baseline:
+        lost = sorted(set(baseline["correct_fields"]) - set(summary["correct_fields"]))
+        if lost:
+            failures.append("no longer extracted correctly: " + ", ".join(lost))
+        floor = baseline["pages_per_second"] * (1 - args.max_slowdown)
+        if summary["pages_per_second"] < floor:
+            failures.append(
+                f"{summary['pages_per_second']:.0f} pages/s is more than {args.max_slowdown:.0%} "
+                f"below the baseline's {baseline['pages_per_second']:.0f}"
+            )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    # The keyword heuristics get a little under half the fixture fields
+    # right; the floor sits just below that until they improve.
+    parser.add_argument("--min-accuracy", type=float, default=0.45,
+                        help="lowest acceptable share of fields extracted correctly")
+    parser.add_argument("--min-pages-per-second", type=float, default=200)
+    parser.add_argument("--baseline", help="JSON summary from an earlier --save to compare against")
+    parser.add_argument("--max-slowdown", type=float, default=0.25,
+                        help="largest acceptable throughput drop against the baseline")
+    parser.add_argument("--save", help="write this run's summary as JSON, for use as a baseline")
+    parser.add_argument("--keep-fixtures", help="write the fixture PDFs to this directory")
+    parser.add_argument("--no-sample", action="store_true", help=f"leave out {SAMPLE_PDF}")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fixture_dir = args.keep_fixtures or tmp
+        os.makedirs(fixture_dir, exist_ok=True)
+        documents = []
+        for fixture in FIXTURES:
+            path = os.path.join(fixture_dir, f"{fixture['name']}.pdf")
+            write_fixture(fixture, path)
+            documents.append((fixture["name"], path, expected_values(fixture)))
+        if not args.no_sample and os.path.exists(SAMPLE_PDF):
+            documents.append(("sample", SAMPLE_PDF, SAMPLE_EXPECTED))
+        rows = run(documents, args.repeat)
+
+    print(f"{'document':<20} {'pages':>5} {'ms':>8} {'pages/s':>8} {'RSS MiB':>8} {'fields':>7}")
+    for r in rows:
+        print(f"{r['name']:<20} {r['pages']:>5} {r['seconds'] * 1000:>8.1f} {r['pages_per_second']:>8.0f} "
+              f"{r['peak_rss_mib']:>8.1f} {r['correct']:>3}/{r['scored']:<3}")
+        for field, values in r["wrong"].items():
+            print(f"    {field}: expected {values['expected']:,.0f}, got {values['actual']:,.0f}")
+
+    summary = summarise(rows)
+    print(f"\n{summary['documents']} documents, {summary['pages']} pages, "
+          f"{summary['pages_per_second']:.0f} pages/s, accuracy {summary['accuracy']:.1%}, "
+          f"peak RSS {summary['peak_rss_mib']:.1f} MiB")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(summary, f, indent=2)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    failures = regressions(summary, args, baseline)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
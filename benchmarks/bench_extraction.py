@@ -0,0 +1,152 @@
+"""
+Compares the single-pass keyword scanner in services.extraction with the
+original per-keyword regex loop on the sample filings, and full-document
+against page-targeted extraction.
+
+    python -m benchmarks.bench_extraction [pdf ...] [--repeat N]
+"""
+import argparse
+import os
+import re
+import tempfile
+import time
+import tracemalloc
+
+import fitz
+
+from services.extraction import FIELD_KEYWORDS, extract_numbers_from_file, extract_numbers_from_text
+
+DEFAULT_PDF = "data/raw/Olympia Capital Holdings Limited - AUDITED FINANCIALS.pdf"
+
+
+def legacy_extract(text):
+    """
+    The pre-scanner implementation: one re.findall over the whole text per
+    keyword. Kept here as the reference for parity and timing.
+    """
+    text = text.replace(",", "").replace("Ksh", "").replace("KES", "").replace("Shs", "").replace("KShs", "").replace("kes", "").replace("Kshs", "").replace("KShs","")
+
+    scale = 1
+    if re.search(r'in thousands|\'000|in 000', text, re.IGNORECASE):
+        scale = 1000
+    elif re.search(r'\'000|000|`000', text, re.IGNORECASE):
+        scale = 1000
+    elif re.search(r'in millions|million|in 000000|\'000000', text, re.IGNORECASE):
+        scale = 1000000
+    elif re.search(r'millions|\'000000|`m|\'m', text, re.IGNORECASE):
+        scale = 1000000
+
+    def find_value(keywords):
+        for keyword in keywords:
+            matches = re.findall(rf"{keyword}[^0-9\-]*([\d\.]+)", text, re.IGNORECASE)
+            numbers = []
+            for m in matches:
+                try:
+                    num = float(m)
+                    if num > 100:
+                        numbers.append(num)
+                except ValueError:
+                    continue
+            if numbers:
+                return max(numbers) * scale
+        return 0.0
+
+    v = {field: find_value(keywords) for field, keywords in FIELD_KEYWORDS.items()}
+
+    if v["net_assets"] == 0.0 and v["total_assets"] and v["total_liabilities"]:
+        v["net_assets"] = v["total_assets"] - v["total_liabilities"]
+    parts = ["cash", "cash_equivalents", "inventories", "accounts_receivables", "marketable_securities",
+             "prepaid_expenses", "other_liquid_assets", "bank_balances", "due_from_related_companies"]
+    if v["current_assets"] == 0.0 and any(v[p] for p in parts):
+        v["current_assets"] = sum(v[p] for p in parts)
+    if v["liquid_capital"] == 0.0 and v["current_assets"] and v["inventories"]:
+        v["liquid_capital"] = v["current_assets"] - v["inventories"]
+    if v["total_liabilities"] == 0.0 and v["non_current_liabilities"] and v["current_liabilities"]:
+        v["total_liabilities"] = v["non_current_liabilities"] + v["current_liabilities"]
+    if v["total_assets"] == 0.0 and v["non_current_assets"] and v["current_assets"]:
+        v["total_assets"] = v["non_current_assets"] + v["current_assets"]
+
+    return {k: v[k] for k in ("share_capital", "liquid_capital", "net_assets", "total_liabilities", "total_assets")}
+
+
+def _best_of(fn, text, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def synthetic_filing(path, pages):
+    """
+    Writes a `pages`-long filing to a temporary file: narrative pages with
+    the sample statements in the middle, roughly the shape of an annual
+    report. Returns the file name.
+    """
+    narrative = ("The directors present their report together with the audited financial "
+                 "statements for the year, which show the state of affairs of the group. ") * 3
+    doc = fitz.open()
+    with fitz.open(path) as sample:
+        for number in range(pages - sample.page_count):
+            if number == pages // 2:
+                doc.insert_pdf(sample)
+            page = doc.new_page()
+            page.insert_textbox(page.rect + (50, 50, -50, -50), "\n\n".join([narrative] * 12), fontsize=9)
+    fd, out = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    doc.save(out)
+    return out
+
+
+def _time_modes(label, path, repeat):
+    results = {}
+    for mode in ("full", "targeted"):
+        best = float("inf")
+        for _ in range(repeat):
+            tracemalloc.start()
+            start = time.perf_counter()
+            results[mode] = extract_numbers_from_file(path, mode)
+            best = min(best, time.perf_counter() - start)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        print(f"{label} {mode}: {best * 1000:.1f} ms, peak Python memory {peak / 1024:.0f} KiB")
+    status = "OK" if results["full"] == results["targeted"] else f"DIFFERS {results}"
+    print(f"{label} targeted vs full: {status}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("pdfs", nargs="*", default=[DEFAULT_PDF])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--pages", type=int, default=200,
+                        help="also time a synthetic report this many pages long")
+    args = parser.parse_args()
+
+    for path in args.pdfs:
+        doc = fitz.open(path)
+        page_texts = [page.get_text() for page in doc]
+        cases = [(f"{path} ({len(page_texts)}p)", "".join(page_texts))]
+        if args.pages:
+            synthetic = (page_texts * (args.pages // len(page_texts) + 1))[:args.pages]
+            cases.append((f"  repeated to {args.pages}p", "".join(synthetic)))
+
+        for label, text in cases:
+            legacy_time, legacy = _best_of(legacy_extract, text, args.repeat)
+            new_time, new = _best_of(extract_numbers_from_text, text, args.repeat)
+            status = "OK" if legacy == new else f"MISMATCH {legacy} != {new}"
+            print(f"{label}: legacy {legacy_time * 1000:.1f} ms, "
+                  f"scanner {new_time * 1000:.1f} ms, "
+                  f"{legacy_time / new_time:.1f}x, {status}")
+
+        _time_modes(path, path, args.repeat)
+        if args.pages:
+            synthetic = synthetic_filing(path, args.pages)
+            try:
+                _time_modes(f"  synthetic {args.pages}p filing", synthetic, args.repeat)
+            finally:
+                os.remove(synthetic)
+
+
+if __name__ == "__main__":
+    main()
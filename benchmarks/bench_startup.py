@@ -0,0 +1,54 @@
+"""
+Measures the cold import of app.main, the cost every server worker pays
+before it can bind, in fresh interpreters. Also times importing the PDF
+and charting libraries the app now loads lazily (the work the startup
+warm-up does in the background) and lists which of them app.main still
+imports eagerly.
+
+    python -m benchmarks.bench_startup [--repeat N]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ("fitz", "matplotlib", "reportlab", "numpy")
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+loaded = [m for m in {heavy!r} if m in sys.modules]
+app.main._warm_up()
+warmed = time.perf_counter()
+print(json.dumps({{"import": imported - start, "warm_up": warmed - imported, "loaded": loaded}}))
+"""
+
+
+def _probe() -> dict:
+    # -W ignore keeps PyMuPDF's deprecation notice out of the JSON line.
+    output = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", _PROBE.format(heavy=HEAVY_MODULES)],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    runs = [_probe() for _ in range(args.repeat)]
+    import_ms = statistics.median(r["import"] for r in runs) * 1000
+    warm_up_ms = statistics.median(r["warm_up"] for r in runs) * 1000
+    print(f"import app.main:      {import_ms:7.0f} ms (median of {args.repeat})")
+    print(f"deferred to warm-up:  {warm_up_ms:7.0f} ms")
+    print(f"eager import would be {import_ms + warm_up_ms:7.0f} ms")
+    print(f"heavy modules loaded at import: {', '.join(runs[-1]['loaded']) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,42 @@
 # services/charts.py
 
-import matplotlib.pyplot as plt
-import io
-import base64
+from functools import lru_cache
+from io import BytesIO
+from services.telemetry import timed
 
-def generate_trend_chart(reports):
+CHART_FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+
+
+@lru_cache(maxsize=256)
+@timed("chart.trend")
+def generate_trend_chart(points, fmt="png"):
     """
-    Takes a list of FinancialReport, returns a base64 PNG.
+    Takes a tuple of (year, share_capital, liquid_capital, net_assets,
+    solvency_ratio) points, oldest first, and returns the trend chart as
+    PNG or SVG bytes. Cached on the points, so an unchanged trend is
+    never plotted twice.
     """
-    years = [r.year for r in reports]
-    capitals = [r.share_capital for r in reports]
-    assets = [r.net_assets for r in reports]
-
-    fig, ax = plt.subplots()
-    ax.plot(years, capitals, label="Share Capital")
-    ax.plot(years, assets, label="Net Assets")
-    ax.set_title("Financial Trends")
-    ax.set_xlabel("Year")
-    ax.set_ylabel("Amount")
-    ax.legend()
-
-    buf = io.BytesIO()
-    fig.savefig(buf, format="png")
-    buf.seek(0)
-    encoded = base64.b64encode(buf.read()).decode("utf-8")
-    return encoded
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    years = [p[0] for p in points]
+    fig = Figure(figsize=(7, 6))
+    FigureCanvasAgg(fig)
+    amounts, solvency = fig.subplots(2, 1, sharex=True, gridspec_kw={"height_ratios": [2, 1]})
+
+    for index, label in ((1, "Share Capital"), (2, "Liquid Capital"), (3, "Net Assets")):
+        amounts.plot(years, [p[index] or 0 for p in points], marker="o", label=label)
+    amounts.set_title("Financial Trends")
+    amounts.set_ylabel("Amount")
+    amounts.legend()
+
+    ratios = [(p[0], p[4]) for p in points if p[4] is not None]
+    solvency.plot([r[0] for r in ratios], [r[1] for r in ratios], marker="o", color="#d62728")
+    solvency.set_ylabel("Solvency Ratio")
+    solvency.set_xlabel("Year")
+    solvency.set_xticks(years)
+
+    fig.tight_layout()
+    buf = BytesIO()
+    fig.savefig(buf, format=fmt)
+    return buf.getvalue()
@@ -0,0 +1,114 @@
+import numpy as np
+
+# Regulatory thresholds per licence type. Issuers are keyed by market
+# segment as well. A liquid capital requirement is the larger of the
+# floor and a share of total liabilities; NaN means "not applicable".
+COMPLIANCE_RULES = [
+    # company_type,     segment, share capital, liquid floor, liquid % of liabilities, net assets
+    ("stockbroker",     None,    50_000_000,    30_000_000,   0.08,                    None),
+    ("fund manager",    None,    10_000_000,    5_000_000,    0.08,                    None),
+    ("investment bank", None,    250_000_000,   30_000_000,   0.08,                    None),
+    ("issuer",          "MIMS",  50_000_000,    None,         None,                    100_000_000),
+    ("issuer",          "AIMS",  20_000_000,    None,         None,                    20_000_000),
+    ("issuer",          "GEMS",  10_000_000,    None,         None,                    100_000),
+]
+
+_RULE_INDEX = {(company_type, segment): i for i, (company_type, segment, *_) in enumerate(COMPLIANCE_RULES)}
+# One extra all-NaN row for companies no rule applies to.
+_RULE_TABLE = np.array(
+    [[np.nan if v is None else v for v in rule[2:]] for rule in COMPLIANCE_RULES] + [[np.nan] * 4],
+    dtype=float,
+)
+_NO_RULE = len(COMPLIANCE_RULES)
+
+
+def rule_key(company_type, market_segment):
+    company_type = (company_type or "").lower()
+    return company_type, market_segment if company_type == "issuer" else None
+
+
+def _as_array(values):
+    # None (a missing figure) becomes NaN, then 0 like `or 0` elsewhere.
+    return np.nan_to_num(np.asarray(values, dtype=float))
+
+
+def evaluate_batch(company_types, market_segments, share_capital, liquid_capital, net_assets, total_liabilities):
+    """
+    Evaluates any number of reports at once. Takes parallel sequences (one
+    entry per report) and returns a dict of numpy arrays: the required
+    share capital, liquid capital and net assets (NaN where a requirement
+    does not apply), the solvency ratio (NaN without liabilities), whether
+    each applicable requirement is met and whether all of them are.
+    """
+    rules = np.fromiter(
+        (_RULE_INDEX.get(rule_key(t, s), _NO_RULE) for t, s in zip(company_types, market_segments)),
+        dtype=np.intp,
+        count=len(company_types),
+    )
+    share_capital = _as_array(share_capital)
+    liquid_capital = _as_array(liquid_capital)
+    net_assets = _as_array(net_assets)
+    total_liabilities = _as_array(total_liabilities)
+
+    thresholds = _RULE_TABLE[rules]
+    share_capital_req = thresholds[:, 0]
+    liquid_capital_req = np.fmax(thresholds[:, 1], thresholds[:, 2] * total_liabilities)
+    net_assets_req = thresholds[:, 3]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        solvency_ratio = np.where(total_liabilities != 0, net_assets / total_liabilities, np.nan)
+
+    share_capital_met = np.isnan(share_capital_req) | (share_capital >= share_capital_req)
+    liquid_capital_met = np.isnan(liquid_capital_req) | (liquid_capital >= liquid_capital_req)
+    net_assets_met = np.isnan(net_assets_req) | (net_assets >= net_assets_req)
+
+    return {
+        "share_capital_req": share_capital_req,
+        "liquid_capital_req": liquid_capital_req,
+        "net_assets_req": net_assets_req,
+        "solvency_ratio": solvency_ratio,
+        "share_capital_met": share_capital_met,
+        "liquid_capital_met": liquid_capital_met,
+        "net_assets_met": net_assets_met,
+        "thresholds_met": share_capital_met & liquid_capital_met & net_assets_met,
+    }
+
+
+def evaluate_report(company, report):
+    """
+    Evaluates a single report. Returns (type_checks, solvency_ratio, result):
+    type_checks holds only the requirements that apply to the company, as
+    shown on the review page and PDF; solvency_ratio is None without
+    liabilities; result is the full row from evaluate_batch.
+    """
+    batch = evaluate_batch(
+        [company.company_type], [company.market_segment],
+        [report.share_capital], [report.liquid_capital], [report.net_assets], [report.total_liabilities],
+    )
+    result = {key: values[0].item() for key, values in batch.items()}
+
+    type_checks = {
+        key: result[key]
+        for key in ("share_capital_req", "liquid_capital_req", "net_assets_req")
+        if not np.isnan(result[key])
+    }
+    solvency_ratio = None if np.isnan(result["solvency_ratio"]) else result["solvency_ratio"]
+    return type_checks, solvency_ratio, result
+
+
+def apply_compliance_status(reports, companies_by_id):
+    """
+    Evaluates FinancialReport rows in one batch and stores thresholds_met
+    and solvency_ratio on them. companies_by_id maps company_id to Company.
+    """
+    if not reports:
+        return
+    companies = [companies_by_id[r.company_id] for r in reports]
+    batch = evaluate_batch(
+        [c.company_type for c in companies], [c.market_segment for c in companies],
+        [r.share_capital for r in reports], [r.liquid_capital for r in reports],
+        [r.net_assets for r in reports], [r.total_liabilities for r in reports],
+    )
+    for report, met, ratio in zip(reports, batch["thresholds_met"], batch["solvency_ratio"]):
+        report.thresholds_met = bool(met)
+        report.solvency_ratio = None if np.isnan(ratio) else float(ratio)
@@ -1,65 +1,195 @@
-import fitz
+import hashlib
+import json
+import os
 import re
+from services.ocr import OCR_VERSION, image_only_pages, ocr_engine, ocr_pages
+from services.telemetry import span
 
-def extract_numbers_from_pdf(file_bytes: bytes) -> dict:
+# "targeted" reads only the pages that look like a statement of financial
+# position (falling back to every page when none do); "full" always reads
+# every page.
+EXTRACTION_MODE = os.getenv("AFRS_EXTRACTION_MODE", "targeted")
+
+# Looked for in the top HEADING_AREA fraction of each page, lower-cased.
+HEADING_AREA = 0.2
+STATEMENT_HEADINGS = (
+    "statement of financial position",
+    "balance sheet",
+    "statement of net assets",
+    "statement of assets and liabilities",
+    "statement of financial condition",
+)
+
+# Keyword lists per field, in priority order. A field takes the largest
+# number found after the first keyword that yields any number at all.
+FIELD_KEYWORDS = {
+    "share_capital": ["Share Capital", "Share capital", "share capital", "Paid Up Capital", "Paid Up capital", "Paid up capital", "paid up capital"],
+    "liquid_capital": ["Liquid Capital", "Liquid capital", "liquid capital", "Working Capital", "Working capital", "working capital"],
+    "net_assets": ["Net Assets", "Net assets", "net assets", "Total Net Assets", "Total Net assets", "Total net assets", "total net assets","Equity", "equity", "Total Equity", "Total equity", "total equity"],
+    "current_assets": ["Current assets", "Current Assets", "current assets"],
+    "inventories": ["Inventories", "inventories", "Inventory", "inventory"],
+    "non_current_assets": ["Non-current Assets", "Non-Current Assets", "Non-current assets", "non-current assets", "Non Current Assets", "Non Current assets", "Non current assets", "non current assets"],
+    "non_current_liabilities": ["Non-Current Liabilities", "Non-Current liabilities", "Non-current liabilities", "non-current liabilities", "Non Current Liabilities", "Non Current liabilities", "Non current liabilities", "non current liabilities"],
+    "current_liabilities": ["Current Liabilities", "Current liabilities", "current liabilities"],
+    "other_liquid_assets": ["Other Financial Assets", "Other Financial assets", "Other financial assets", "other financial assets", "Other Liquid Assets", "Other Liquid assets", "Other liquid assets", "other liquid assets"],
+    "cash": ["cash", "Cash"],
+    "cash_equivalents": ["Cash Equivalents", "Cash Equivalent", "Cash equivalents", "cash equivalents", "Cash equivalent", "cash equivalent"],
+    "bank_balances": ["Bank Balance", "Bank balance", "bank balance", "Bank Balances", "Bank balances", "bank balances", "Bank and cash balances", "Bank and Cash Balances", "Bank and Cash balances", "Bank and cash balances", "bank and cash balances", "Bank and Cash Balance", "Bank and Cash balance", "Bank and cash balance", "bank and cash balance", "Bank Account Balances", "Bank Account balances", "Bank account balances", "bank account balances", "Bank Account Balance", "Bank Account balance", "Bank account balance", "bank account balance"],
+    "due_from_related_companies": ["Due from related companies", "Due from related companies-current"],
+    "prepaid_expenses": ["Prepaid Expenses", "Prepaid expenses", "prepaid expenses", "Prepaid Expense", "Prepaid expense", "prepaid expense"],
+    "marketable_securities": ["Marketable Securities", "Marketable securities", "marketable securities", "Marketable Assets", "Marketable assets", "marketables assets"],
+    "accounts_receivables": ["receivables", "Receivables","receivable", "receivable", "Account Receivables", "Account receivables", "account receivables", "Account Receivable", "Account receivable", "account receivable", "Accounts Receivables", "Accounts receivables", "accounts receivables", "Trade and other receivables"],
+    "total_assets": ["Total Assets", "Total assets", "total assets", "Assets Total","Assets total", "assets total", "Assets", "assets"],
+    "total_liabilities": ["Total Liabilities", "Total liabilities", "total liabilities", "Liabilities Total", "Liabilities total", "liabilities total", "Liabilities", "liabilities"],
+}
+
+# The figures the compliance checks need. A filing whose text layer is
+# missing one of them has its scanned pages, if any, OCR'd.
+KEY_FIELDS = ("share_capital", "liquid_capital", "net_assets", "total_liabilities")
+
+# Bump when extraction rules outside FIELD_KEYWORDS change (scale
+# detection, number filtering, derived fields) so cached results are
+# recomputed.
+EXTRACTION_RULES_REVISION = 1
+EXTRACTOR_VERSION = hashlib.sha256(
+    json.dumps([EXTRACTION_RULES_REVISION, EXTRACTION_MODE, HEADING_AREA, STATEMENT_HEADINGS, FIELD_KEYWORDS, KEY_FIELDS, OCR_VERSION], sort_keys=True).encode()
+).hexdigest()[:16]
+
+
+def _dedupe(keywords):
+    seen = []
+    for keyword in keywords:
+        if keyword.lower() not in seen:
+            seen.append(keyword.lower())
+    return seen
+
+
+def _trie_pattern(words):
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+# Matching is case-insensitive, so the case variants above collapse into
+# one lower-cased keyword each. All keywords across all fields are compiled
+# into a single trie-shaped pattern that matches the longest keyword at a
+# position; the shorter keywords starting at the same position are exactly
+# its prefixes.
+_FIELD_PRIORITY = {field: _dedupe(keywords) for field, keywords in FIELD_KEYWORDS.items()}
+_KEYWORDS = sorted({k for keywords in _FIELD_PRIORITY.values() for k in keywords})
+_KEYWORD_SCANNER = re.compile(_trie_pattern(_KEYWORDS))
+_PREFIXES = {k: [p for p in _KEYWORDS if k.startswith(p)] for k in _KEYWORDS}
+_NUMBER_AFTER = re.compile(r"[^0-9\-]*(\d[\d\.]*)")
+# Characters that re.IGNORECASE matches against ASCII letters but that
+# str.lower() does not map onto them.
+_IGNORECASE_EXTRAS = str.maketrans({"\u0130": "i", "\u0131": "i", "\u017f": "s", "\u212a": "k"})
+
+# Unit scale markers, matched against case-folded text.
+_SCALE_THOUSANDS = re.compile(r'in thousands|\'000|in 000')
+_SCALE_THOUSANDS_LOOSE = re.compile(r'\'000|000|`000')
+_SCALE_MILLIONS = re.compile(r'in millions|million|in 000000|\'000000')
+_SCALE_MILLIONS_LOOSE = re.compile(r'millions|\'000000|`m|\'m')
+
+
+def _fold_case(text: str) -> str:
     """
-    Extract key financial numbers from PDF text.
-    Detects unit scale (thousands, millions) and does basic math for derived fields.
+    Lower-cases text so that plain matching against lower-case patterns
+    behaves exactly like re.IGNORECASE matching against the original.
     """
+    if any(ch in text for ch in "\u0130\u0131\u017f\u212a"):
+        text = text.translate(_IGNORECASE_EXTRAS)
+    return text.lower()
 
-    doc = fitz.open(stream=file_bytes, filetype="pdf")
-    text = ""
 
-    for page in doc:
-        text += page.get_text()
+def _scan_keywords(text: str) -> dict:
+    """
+    Walks the case-folded text once and returns the largest number (> 100)
+    found after each keyword, keyed by keyword.
+    """
+    best = {}
+    numbers_at = {}
+    match = _KEYWORD_SCANNER.search(text)
+
+    while match:
+        start = match.start()
+        for keyword in _PREFIXES[match.group()]:
+            end = start + len(keyword)
+            if end not in numbers_at:
+                number = _NUMBER_AFTER.match(text, end)
+                try:
+                    numbers_at[end] = float(number.group(1)) if number else None
+                except ValueError:
+                    numbers_at[end] = None
+            num = numbers_at[end]
+            if num is not None and num > 100:  #skip tiny note refs
+                if num > best.get(keyword, 0):
+                    best[keyword] = num
+        # Overlapping keywords ("assets" inside "total assets") must be seen
+        # too, so resume one character on rather than after the match.
+        match = _KEYWORD_SCANNER.search(text, start + 1)
+    return best
 
-    text = text.replace(",", "").replace("Ksh", "").replace("KES", "").replace("Shs", "").replace("KShs", "").replace("kes", "").replace("Kshs", "").replace("KShs","")
 
+def _detect_scale(text: str) -> int:
     scale = 1
-    if re.search(r'in thousands|\'000|in 000', text, re.IGNORECASE):
+    if _SCALE_THOUSANDS.search(text):
         scale = 1000
-    elif re.search(r'\'000|000|`000', text, re.IGNORECASE):
+    elif _SCALE_THOUSANDS_LOOSE.search(text):
         scale = 1000
-    elif re.search(r'in millions|million|in 000000|\'000000', text, re.IGNORECASE):
+    elif _SCALE_MILLIONS.search(text):
         scale = 1000000
-    elif re.search(r'millions|\'000000|`m|\'m', text, re.IGNORECASE):
+    elif _SCALE_MILLIONS_LOOSE.search(text):
         scale = 1000000
+    return scale
 
-    def find_value(keywords):
-        for keyword in keywords:
-            pattern = rf"{keyword}[^0-9\-]*([\d\.]+)"
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            numbers = []
-            for m in matches:
-                try:
-                    num = float(m)
-                    if num > 100 and (type(num) == int or type(num) == float):  #skip tiny note refs
-                        numbers.append(num)
-                except ValueError:
-                    continue
-            if numbers:
-                return max(numbers) * scale
+
+def extract_numbers_from_text(text: str) -> dict:
+    """
+    Extract key financial numbers from already-extracted PDF text.
+    """
+    text = text.replace(",", "").replace("Ksh", "").replace("KES", "").replace("Shs", "").replace("KShs", "").replace("kes", "").replace("Kshs", "").replace("KShs","")
+
+    folded = _fold_case(text)
+    scale = _detect_scale(folded)
+    best = _scan_keywords(folded)
+
+    def find_value(field):
+        for keyword in _FIELD_PRIORITY[field]:
+            if keyword in best:
+                return best[keyword] * scale
         return 0.0
 
-    share_capital = find_value(["Share Capital", "Share capital", "share capital", "Paid Up Capital", "Paid Up capital", "Paid up capital", "paid up capital"])
-    liquid_capital = find_value(["Liquid Capital", "Liquid capital", "liquid capital", "Working Capital", "Working capital", "working capital"])
-    net_assets = find_value(["Net Assets", "Net assets", "net assets", "Total Net Assets", "Total Net assets", "Total net assets", "total net assets","Equity", "equity", "Total Equity", "Total equity", "total equity"])
-    current_assets = find_value(["Current assets", "Current Assets", "current assets"])
-    inventories = find_value(["Inventories", "inventories", "Inventory", "inventory"])
-    non_current_assets = find_value(["Non-current Assets", "Non-Current Assets", "Non-current assets", "non-current assets", "Non Current Assets", "Non Current assets", "Non current assets", "non current assets"])
-    non_current_liabilities = find_value(["Non-Current Liabilities", "Non-Current liabilities", "Non-current liabilities", "non-current liabilities", "Non Current Liabilities", "Non Current liabilities", "Non current liabilities", "non current liabilities"])
-    current_liabilities = find_value(["Current Liabilities", "Current liabilities", "current liabilities"])
-    other_liquid_assets = find_value(["Other Financial Assets", "Other Financial assets", "Other financial assets", "other financial assets", "Other Liquid Assets", "Other Liquid assets", "Other liquid assets", "other liquid assets"])
-    cash = find_value(["cash", "Cash"])
-    cash_equivalents = find_value(["Cash Equivalents", "Cash Equivalent", "Cash equivalents", "cash equivalents", "Cash equivalent", "cash equivalent"])
-    bank_balances = find_value(["Bank Balance", "Bank balance", "bank balance", "Bank Balances", "Bank balances", "bank balances", "Bank and cash balances", "Bank and Cash Balances", "Bank and Cash balances", "Bank and cash balances", "bank and cash balances", "Bank and Cash Balance", "Bank and Cash balance", "Bank and cash balance", "bank and cash balance", "Bank Account Balances", "Bank Account balances", "Bank account balances", "bank account balances", "Bank Account Balance", "Bank Account balance", "Bank account balance", "bank account balance"])
-    due_from_related_companies = find_value(["Due from related companies", "Due from related companies-current"])
-    prepaid_expenses = find_value(["Prepaid Expenses", "Prepaid expenses", "prepaid expenses", "Prepaid Expense", "Prepaid expense", "prepaid expense"])
-    marketable_securities = find_value(["Marketable Securities", "Marketable securities", "marketable securities", "Marketable Assets", "Marketable assets", "marketables assets"])
-    accounts_receivables = find_value(["receivables", "Receivables","receivable", "receivable", "Account Receivables", "Account receivables", "account receivables", "Account Receivable", "Account receivable", "account receivable", "Accounts Receivables", "Accounts receivables", "accounts receivables", "Trade and other receivables"])
-
-    total_assets = find_value(["Total Assets", "Total assets", "total assets", "Assets Total","Assets total", "assets total", "Assets", "assets"])
-    total_liabilities = find_value(["Total Liabilities", "Total liabilities", "total liabilities", "Liabilities Total", "Liabilities total", "liabilities total", "Liabilities", "liabilities"])
+    share_capital = find_value("share_capital")
+    liquid_capital = find_value("liquid_capital")
+    net_assets = find_value("net_assets")
+    current_assets = find_value("current_assets")
+    inventories = find_value("inventories")
+    non_current_assets = find_value("non_current_assets")
+    non_current_liabilities = find_value("non_current_liabilities")
+    current_liabilities = find_value("current_liabilities")
+    other_liquid_assets = find_value("other_liquid_assets")
+    cash = find_value("cash")
+    cash_equivalents = find_value("cash_equivalents")
+    bank_balances = find_value("bank_balances")
+    due_from_related_companies = find_value("due_from_related_companies")
+    prepaid_expenses = find_value("prepaid_expenses")
+    marketable_securities = find_value("marketable_securities")
+    accounts_receivables = find_value("accounts_receivables")
+
+    total_assets = find_value("total_assets")
+    total_liabilities = find_value("total_liabilities")
 
     if net_assets == 0.0 and total_assets and total_liabilities:
         net_assets = total_assets - total_liabilities
@@ -69,10 +199,10 @@ def extract_numbers_from_pdf(file_bytes: bytes) -> dict:
 
     if liquid_capital == 0.0 and current_assets and inventories:
         liquid_capital = current_assets - inventories
-    
+
     if total_liabilities == 0.0 and non_current_liabilities and current_liabilities:
         total_liabilities = non_current_liabilities + current_liabilities
-    
+
     if total_assets == 0.0 and non_current_assets and current_assets:
         total_assets = non_current_assets + current_assets
 
@@ -81,5 +211,106 @@ def extract_numbers_from_pdf(file_bytes: bytes) -> dict:
         "liquid_capital": liquid_capital,
         "net_assets": net_assets,
         "total_liabilities": total_liabilities,
-        "total_assets": total_assets,  
+        "total_assets": total_assets,
     }
+
+
+def find_statement_pages(doc) -> list:
+    """
+    Returns the numbers of the pages whose heading area names a balance
+    sheet, plus the page after each (statements often run over a page).
+    Only the heading area of every page is read, which is much cheaper than
+    full-page text extraction.
+    """
+    pages = set()
+    for page in doc:
+        rect = page.rect
+        heading_area = (rect.x0, rect.y0, rect.x1, rect.y0 + rect.height * HEADING_AREA)
+        heading = " ".join(page.get_text(clip=heading_area).lower().split())
+        if any(h in heading for h in STATEMENT_HEADINGS):
+            pages.add(page.number)
+            if page.number + 1 < doc.page_count:
+                pages.add(page.number + 1)
+    return sorted(pages)
+
+
+def _keywords(text: str) -> dict:
+    with span("extraction.keywords"):
+        return extract_numbers_from_text(text)
+
+
+def _extract_text_layer(doc, mode: str):
+    """
+    Figures from the text layer, and the statement pages found by heading
+    (None in full mode, where headings are not looked for).
+    """
+    statement_pages = None
+    if mode == "targeted":
+        with span("extraction.find_pages"):
+            statement_pages = find_statement_pages(doc)
+        if statement_pages:
+            with span("extraction.text"):
+                text = "".join(doc[i].get_text() for i in statement_pages)
+            extracted = _keywords(text)
+            if any(extracted.values()):
+                return extracted, statement_pages
+
+    with span("extraction.text"):
+        text = "".join(page.get_text() for page in doc)
+    return _keywords(text), statement_pages
+
+
+def _extract_from_doc(doc, mode: str) -> dict:
+    extracted, statement_pages = _extract_text_layer(doc, mode)
+    complete = all(extracted[field] for field in KEY_FIELDS)
+    if (complete and statement_pages) or ocr_engine() is None:
+        return extracted
+
+    # The statements may be scanned even when other pages (a cover, the
+    # directors' report) have text. Scanned pages are OCR'd when no
+    # statement heading is in the text layer or a key figure is missing.
+    scanned = image_only_pages(doc)
+    if not scanned:
+        return extracted
+    if statement_pages is None:
+        with span("extraction.find_pages"):
+            statement_pages = find_statement_pages(doc)
+    if complete and statement_pages:
+        return extracted
+
+    with span("extraction.ocr"):
+        texts = ocr_pages(doc, scanned)
+    if not texts:
+        return extracted
+    from_scans = _keywords("".join(texts[number] for number in sorted(texts)))
+    # Without a statement heading in the text layer the statements are the
+    # scans, and their figures win over whatever the text pages yielded;
+    # otherwise OCR only fills the gaps.
+    primary, fallback = (extracted, from_scans) if statement_pages else (from_scans, extracted)
+    return {field: primary[field] or fallback[field] for field in extracted}
+
+
+def extract_numbers_from_pdf(file_bytes: bytes, mode: str = EXTRACTION_MODE) -> dict:
+    """
+    Extract key financial numbers from PDF text.
+    Detects unit scale (thousands, millions) and does basic math for derived fields.
+    """
+    import fitz  # PyMuPDF, loaded on first use
+
+    with span("extraction.open"):
+        doc = fitz.open(stream=file_bytes, filetype="pdf")
+    with doc:
+        return _extract_from_doc(doc, mode)
+
+
+def extract_numbers_from_file(path: str, mode: str = EXTRACTION_MODE) -> dict:
+    """
+    Same as extract_numbers_from_pdf, but reads the PDF from disk so large
+    batches do not have to be passed around as bytes.
+    """
+    import fitz  # PyMuPDF, loaded on first use
+
+    with span("extraction.open"):
+        doc = fitz.open(path)
+    with doc:
+        return _extract_from_doc(doc, mode)
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from services.extraction import EXTRACTOR_VERSION
+
+EXTRACTION_CACHE_PATH = os.getenv("AFRS_EXTRACTION_CACHE", "./extraction_cache.db")
+EXTRACTION_CACHE_MAX_BYTES = int(float(os.getenv("AFRS_EXTRACTION_CACHE_MB", 16)) * 1024 * 1024)
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def sha256_file(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+class ExtractionCache:
+    """
+    Stores extract_numbers_from_pdf results keyed by the SHA-256 of the PDF
+    bytes, so a byte-identical re-upload is not parsed again. Entries carry
+    the extractor version they were computed with and are ignored (and
+    purged) once the extraction rules change. When the stored results grow
+    past `max_bytes` the least recently used entries are evicted.
+    """
+
+    def __init__(self, path=EXTRACTION_CACHE_PATH, max_bytes=EXTRACTION_CACHE_MAX_BYTES, version=EXTRACTOR_VERSION):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.version = version
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS extraction_cache ("
+                " sha256 TEXT PRIMARY KEY, version TEXT NOT NULL, result TEXT NOT NULL,"
+                " size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("DELETE FROM extraction_cache WHERE version != ?", (self.version,))
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, digest: str):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT result FROM extraction_cache WHERE sha256 = ? AND version = ?",
+                (digest, self.version),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE extraction_cache SET last_used = ? WHERE sha256 = ?", (time.time(), digest))
+        return json.loads(row[0])
+
+    def put(self, digest: str, result: dict):
+        payload = json.dumps(result)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO extraction_cache (sha256, version, result, size, last_used)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (digest, self.version, payload, len(payload), time.time()),
+            )
+            # Keep the most recently used entries that fit in max_bytes.
+            conn.execute(
+                "DELETE FROM extraction_cache WHERE sha256 IN ("
+                " SELECT sha256 FROM (SELECT sha256, SUM(size) OVER (ORDER BY last_used DESC) AS running"
+                " FROM extraction_cache) WHERE running > ?)",
+                (self.max_bytes,),
+            )
@@ -0,0 +1,117 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from starlette.concurrency import run_in_threadpool
+
+from services.extraction import extract_numbers_from_file
+from services.extraction_cache import sha256_file
+from services.telemetry import collect_spans, record_spans, span
+
+EXTRACTION_WORKERS = int(os.getenv("AFRS_EXTRACTION_WORKERS", min(4, os.cpu_count() or 1)))
+EXTRACTION_MAX_PENDING = int(os.getenv("AFRS_EXTRACTION_MAX_PENDING", 16))
+EXTRACTION_TIMEOUT = float(os.getenv("AFRS_EXTRACTION_TIMEOUT", 120))
+MAX_UPLOAD_BYTES = int(float(os.getenv("AFRS_MAX_UPLOAD_MB", 50)) * 1024 * 1024)
+
+
+def worker_context():
+    """
+    Start method for process pools inside the server. Forking a process
+    that has other threads running (the threadpool, the startup warm-up
+    importing PyMuPDF) can copy a held lock into the child and hang it, so
+    workers are forked from a single-threaded forkserver instead, with
+    PyMuPDF already loaded.
+    """
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(["fitz", "services.extraction", "services.statement_parser"])
+    return context
+
+
+class ExtractionError(Exception):
+    """Base class for jobs the pool refused or could not finish."""
+
+
+class ExtractionQueueFull(ExtractionError):
+    pass
+
+
+class ExtractionTimeout(ExtractionError):
+    pass
+
+
+class ExtractionTooLarge(ExtractionError):
+    pass
+
+
+class ExtractionPool:
+    """
+    Runs extract_numbers_from_pdf in worker processes so a large filing
+    never blocks the event loop. At most `max_pending` jobs may be queued
+    or running at once; further submissions are rejected rather than piling
+    up behind a busy pool. With an ExtractionCache, files that were parsed
+    before are answered from the cache without touching the pool.
+    """
+
+    def __init__(self, max_workers=EXTRACTION_WORKERS, max_pending=EXTRACTION_MAX_PENDING,
+                 timeout=EXTRACTION_TIMEOUT, max_bytes=MAX_UPLOAD_BYTES, cache=None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.cache = cache
+        self.pending = 0
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=worker_context())
+        return self._executor
+
+    def _release(self, _future):
+        self.pending -= 1
+
+    async def run(self, func, *args):
+        """
+        Runs func(*args) in the pool and awaits its result.
+        """
+        if self.pending >= self.max_pending:
+            raise ExtractionQueueFull(f"{self.pending} extraction jobs already pending")
+
+        # Spans recorded in the worker come back with the result.
+        future = asyncio.wrap_future(self._get_executor().submit(collect_spans, func, *args))
+        self.pending += 1
+        # The slot is held until the worker really finishes, even if the
+        # caller gave up waiting, so timed-out jobs still count as load.
+        future.add_done_callback(self._release)
+        try:
+            with span("extraction.pool"):
+                result, spans = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            raise ExtractionTimeout(f"extraction took longer than {self.timeout:.0f}s")
+        record_spans(spans)
+        return result
+
+    async def extract_file(self, path: str) -> dict:
+        """
+        Extracts a PDF that is already on disk. Workers open it by path, so
+        the file is never copied through memory or pickled to the pool.
+        """
+        if await run_in_threadpool(os.path.getsize, path) > self.max_bytes:
+            raise ExtractionTooLarge(f"file exceeds {self.max_bytes / (1024 * 1024):g} MB")
+        if self.cache is None:
+            return await self.run(extract_numbers_from_file, path)
+
+        digest = await run_in_threadpool(sha256_file, path)
+        cached = await run_in_threadpool(self.cache.get, digest)
+        if cached is not None:
+            return cached
+        extracted = await self.run(extract_numbers_from_file, path)
+        await run_in_threadpool(self.cache.put, digest, extracted)
+        return extracted
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,134 @@
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+# "auto" uses Tesseract when it is installed; "off" never runs OCR.
+OCR_MODE = os.getenv("AFRS_OCR", "auto")
+TESSERACT = os.getenv("AFRS_TESSERACT", "tesseract")
+OCR_LANG = os.getenv("AFRS_OCR_LANG", "eng")
+OCR_DPI = int(os.getenv("AFRS_OCR_DPI", 300))
+# Every extraction worker runs its own Tesseract processes, so the CPUs
+# are split between them. (Read here rather than imported from
+# extraction_pool, which imports this module.)
+_EXTRACTION_WORKERS = int(os.getenv("AFRS_EXTRACTION_WORKERS", min(4, os.cpu_count() or 1)))
+OCR_WORKERS = int(os.getenv("AFRS_OCR_WORKERS", max(1, (os.cpu_count() or 1) // _EXTRACTION_WORKERS)))
+OCR_PAGE_TIMEOUT = float(os.getenv("AFRS_OCR_PAGE_TIMEOUT", 60))
+OCR_CACHE_PATH = os.getenv("AFRS_OCR_CACHE", "./ocr_cache.db")
+OCR_CACHE_MAX_BYTES = int(float(os.getenv("AFRS_OCR_CACHE_MB", 64)) * 1024 * 1024)
+
+# Page segmentation mode 6 reads the page as one block of lines, which
+# keeps a statement label and its figures on the same line of output.
+_PSM = "6"
+
+
+def ocr_engine():
+    """
+    Path of the Tesseract binary, or None when OCR is off or unavailable.
+    """
+    if OCR_MODE == "off":
+        return None
+    return shutil.which(TESSERACT)
+
+
+# Part of the extractor version, so cached extractions are redone once
+# OCR becomes available or its settings change.
+OCR_VERSION = f"tesseract:{OCR_LANG}:{OCR_DPI}:{_PSM}" if ocr_engine() else "none"
+
+
+def image_only_pages(doc) -> list:
+    """
+    Numbers of the pages that carry images but no text layer, i.e. scans.
+    Only pages with images have their text read, so a text filing costs
+    little more than a look at each page's resources.
+    """
+    return [
+        page.number for page in doc
+        if page.get_images(full=False) and not page.get_text().strip()
+    ]
+
+
+def page_digest(doc, page) -> str:
+    """
+    Hash of what a page draws: its content stream and the raw bytes of its
+    images. Computed without rasterising, so cache hits cost almost
+    nothing.
+    """
+    digest = hashlib.sha256(f"{OCR_VERSION}\0".encode())
+    digest.update(page.read_contents())
+    for image in page.get_images(full=False):
+        digest.update(doc.xref_stream_raw(image[0]) or b"")
+    return digest.hexdigest()
+
+
+def _tesseract(engine: str, png: bytes):
+    # None when Tesseract fails or runs out of time; the page is then left
+    # out rather than failing the whole extraction.
+    try:
+        result = subprocess.run(
+            [engine, "stdin", "stdout", "-l", OCR_LANG, "--psm", _PSM],
+            input=png, capture_output=True, timeout=OCR_PAGE_TIMEOUT, check=True,
+        )
+    except (subprocess.SubprocessError, OSError) as exc:
+        logger.warning("OCR failed: %s", exc)
+        return None
+    return result.stdout.decode("utf-8", errors="replace")
+
+
+def _default_cache():
+    from services.extraction_cache import ExtractionCache
+    return ExtractionCache(path=OCR_CACHE_PATH, max_bytes=OCR_CACHE_MAX_BYTES, version=OCR_VERSION)
+
+
+def ocr_pages(doc, page_numbers, cache=None, workers=OCR_WORKERS) -> dict:
+    """
+    OCR text of the given pages, keyed by page number. Pages seen before
+    come from the cache; the rest are rasterised one at a time here and
+    handed to Tesseract, one process per page with up to `workers` running
+    at once. Pages Tesseract fails on are missing from the result, which is
+    {} when no OCR engine is available.
+    """
+    engine = ocr_engine()
+    if engine is None or not page_numbers:
+        return {}
+    import fitz  # PyMuPDF
+
+    cache = cache or _default_cache()
+
+    texts = {}
+    misses = []
+    for number in page_numbers:
+        digest = page_digest(doc, doc[number])
+        cached = cache.get(digest)
+        if cached is not None:
+            texts[number] = cached["text"]
+        else:
+            misses.append((number, digest))
+    if not misses:
+        return texts
+
+    in_flight = {}
+
+    def collect(done):
+        for future in done:
+            number, digest = in_flight.pop(future)
+            text = future.result()
+            if text is not None:
+                texts[number] = text
+                cache.put(digest, {"text": text})
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for number, digest in misses:
+            # Rendering stays on this thread (a document is not thread-safe);
+            # only a couple of rendered pages per worker wait at a time.
+            if len(in_flight) >= workers * 2:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            png = doc[number].get_pixmap(dpi=OCR_DPI, colorspace=fitz.csGRAY).tobytes("png")
+            in_flight[executor.submit(_tesseract, engine, png)] = (number, digest)
+        collect(list(in_flight))
+    return texts
@@ -1,20 +1,22 @@
-import os
 from io import BytesIO
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
-import matplotlib.pyplot as plt
+from services.telemetry import timed
 
-UPLOAD_DIR = "uploads"
-CHARTS_DIR = "charts"
-os.makedirs(CHARTS_DIR, exist_ok=True)
+# matplotlib and ReportLab take most of a second to import, so they are
+# loaded on the first review rather than when the server starts.
 
-def generate_compliance_chart(report, company_id, year):
+@timed("review.chart")
+def generate_compliance_chart(report, year):
     """
-    Creates a simple bar chart of key figures and saves it as PNG.
-    Returns the chart file path.
+    Creates a simple bar chart of key figures and returns it as an
+    in-memory PNG. Uses a standalone Figure on the Agg canvas rather than
+    pyplot, so concurrent requests share no global plotting state.
     """
-    fig, ax = plt.subplots(figsize=(6, 4))
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(6, 4))
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
     labels = ['Share Capital', 'Liquid Capital', 'Net Assets', 'Liabilities']
     values = [
         report.share_capital or 0,
@@ -30,17 +32,21 @@ def generate_compliance_chart(report, company_id, year):
     for i, v in enumerate(values):
         ax.text(i, v + max(values) * 0.01, f"{v:,.0f}", ha='center', fontsize=8)
 
-    chart_path = os.path.join(CHARTS_DIR, f"{company_id}_{year}.png")
-    plt.tight_layout()
-    plt.savefig(chart_path)
-    plt.close(fig)
-
-    return chart_path
+    fig.tight_layout()
+    png = BytesIO()
+    fig.savefig(png, format="png")
+    png.seek(0)
+    return png
 
+@timed("review.pdf")
 def build_review_pdf(company, report, type_checks, solvency_ratio):
     """
     Builds a PDF review report using ReportLab and embedded compliance chart.
     """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.utils import ImageReader
+    from reportlab.pdfgen import canvas
+
     buffer = BytesIO()
     pdf = canvas.Canvas(buffer, pagesize=A4)
     width, height = A4
@@ -96,10 +102,10 @@ def build_review_pdf(company, report, type_checks, solvency_ratio):
     y -= 30
 
     # Insert chart image
-    chart_path = generate_compliance_chart(report, company.id, report.year)
+    chart_png = generate_compliance_chart(report, report.year)
 
     try:
-        img = ImageReader(chart_path)
+        img = ImageReader(chart_png)
         img_width, img_height = img.getSize()
         aspect = img_height / float(img_width)
 
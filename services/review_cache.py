@@ -0,0 +1,93 @@
+import glob
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+REVIEW_CACHE_ENTRIES = int(os.getenv("AFRS_REVIEW_CACHE_ENTRIES", 128))
+# Set to a directory to keep rendered reviews across restarts as well.
+REVIEW_CACHE_DIR = os.getenv("AFRS_REVIEW_CACHE_DIR") or None
+
+# Bump when build_review_pdf's layout changes so stored PDFs are rebuilt.
+REVIEW_LAYOUT_VERSION = 1
+
+
+def review_version(company, report, type_checks, solvency_ratio) -> str:
+    """
+    Fingerprint of everything a review PDF is rendered from. Any change to
+    the report, the company or the thresholds gives a new version.
+    """
+    inputs = (
+        REVIEW_LAYOUT_VERSION,
+        company.name, company.company_type, company.market_segment,
+        report.year, report.share_capital, report.liquid_capital, report.net_assets,
+        report.total_liabilities, report.submission_requirements_met, report.publication_requirements_met,
+        sorted(type_checks.items()), solvency_ratio,
+    )
+    return hashlib.sha256(repr(inputs).encode()).hexdigest()[:16]
+
+
+class ReviewArtifactCache:
+    """
+    Rendered review PDFs keyed by (report id, version). Holds up to
+    `max_entries` in memory, least recently used out first, and optionally
+    mirrors them to `directory`. Callers invalidate a report when it is
+    changed or deleted; the version also changes with the content, so a
+    missed invalidation can never serve a stale PDF.
+    """
+
+    def __init__(self, max_entries=REVIEW_CACHE_ENTRIES, directory=REVIEW_CACHE_DIR):
+        self.max_entries = max_entries
+        self.directory = directory
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, report_id, version):
+        return os.path.join(self.directory, f"{report_id}-{version}.pdf")
+
+    def get(self, report_id: int, version: str):
+        key = (report_id, version)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        if self.directory and os.path.exists(self._path(report_id, version)):
+            with open(self._path(report_id, version), "rb") as f:
+                data = f.read()
+            self._remember(key, data)
+            return data
+        return None
+
+    def put(self, report_id: int, version: str, data: bytes):
+        self._remember((report_id, version), data)
+        if self.directory:
+            # Older versions of the same report can never be served again.
+            self._remove_files(report_id)
+            partial = self._path(report_id, version) + ".part"
+            with open(partial, "wb") as f:
+                f.write(data)
+            os.replace(partial, self._path(report_id, version))
+
+    def invalidate(self, report_id: int):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == report_id]:
+                del self._entries[key]
+        if self.directory:
+            self._remove_files(report_id)
+
+    def _remember(self, key, data):
+        with self._lock:
+            self._entries[key] = data
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _remove_files(self, report_id):
+        for path in glob.glob(os.path.join(self.directory, f"{report_id}-*.pdf")):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,192 @@
+import html
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from services.ocr import image_only_pages, ocr_engine, ocr_pages
+
+SEARCH_INDEX_PATH = os.getenv("AFRS_SEARCH_INDEX", "./search_index.db")
+
+# Snippet markers that cannot occur in PDF text; swapped for <mark> tags
+# after the snippet has been HTML-escaped.
+_OPEN, _CLOSE = "\x02", "\x03"
+SNIPPET_TOKENS = 24
+# A page's rowid is report_id << _PAGE_BITS | page, so a report's pages
+# are one rowid range and can be dropped without scanning the table.
+_PAGE_BITS = 20
+_QUERY_ERRORS = ("fts5:", "no such column", "unterminated string", "unknown special query")
+
+
+class SearchQueryError(ValueError):
+    """The search text is not a valid FTS5 query."""
+
+
+def _is_query_error(error: sqlite3.OperationalError) -> bool:
+    # How FTS5 reports a bad query: "fts5: syntax error near ...", an
+    # unknown column ("no such column: x"), an unterminated string, a bare *.
+    message = str(error)
+    return message.startswith(_QUERY_ERRORS) or "syntax error" in message
+
+
+def page_texts(doc) -> list:
+    """
+    The text of every page, in order. Scanned pages are OCR'd when
+    Tesseract is available (and come from the OCR cache if extraction
+    already read them); otherwise they are empty.
+    """
+    texts = [page.get_text() for page in doc]
+    scanned = [n for n in image_only_pages(doc) if not texts[n].strip()]
+    if scanned and ocr_engine():
+        for number, text in ocr_pages(doc, scanned).items():
+            texts[number] = text
+    return texts
+
+
+def page_texts_file(path: str) -> list:
+    """
+    Same as page_texts, for a PDF on disk.
+    """
+    import fitz  # PyMuPDF, loaded on first use
+
+    with fitz.open(path) as doc:
+        return page_texts(doc)
+
+
+class SearchIndex:
+    """
+    Full-text index of the page text of every filing, in a SQLite FTS5
+    table of its own, so it works whichever database holds the reports.
+    Each page is a row carrying its report, company and year, so searches
+    are answered from the index alone without opening any PDF. Porter
+    stemming lets "concern" match "concerns".
+    """
+
+    def __init__(self, path=SEARCH_INDEX_PATH):
+        self.path = path
+        self._ready = False
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        try:
+            if not self._ready:
+                self._create(conn)
+                self._ready = True
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _create(conn):
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS pages USING fts5("
+            " text, report_id UNINDEXED, company_id UNINDEXED, year UNINDEXED, page UNINDEXED,"
+            " tokenize='porter unicode61')"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS indexed_reports ("
+            " report_id INTEGER PRIMARY KEY, company_id INTEGER NOT NULL, year INTEGER NOT NULL,"
+            " pages INTEGER NOT NULL, indexed_at REAL NOT NULL)"
+        )
+
+    def index_report(self, report_id: int, company_id: int, year: int, texts):
+        """
+        Replaces the report's pages with `texts` (one string per page).
+        """
+        self.index_reports([(report_id, company_id, year, texts)])
+
+    def index_reports(self, reports):
+        """
+        index_report for many (report_id, company_id, year, texts) at once,
+        in one transaction; much faster for bulk loads.
+        """
+        with self._connect() as conn:
+            for report_id, company_id, year, texts in reports:
+                self._delete_pages(conn, report_id)
+                conn.executemany(
+                    "INSERT INTO pages (rowid, text, report_id, company_id, year, page) VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        ((report_id << _PAGE_BITS) | (number + 1), text, report_id, company_id, year, number + 1)
+                        for number, text in enumerate(texts) if text.strip()
+                    ),
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO indexed_reports (report_id, company_id, year, pages, indexed_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (report_id, company_id, year, len(texts), time.time()),
+                )
+
+    @staticmethod
+    def _delete_pages(conn, report_id):
+        conn.execute(
+            "DELETE FROM pages WHERE rowid BETWEEN ? AND ?",
+            (report_id << _PAGE_BITS, ((report_id + 1) << _PAGE_BITS) - 1),
+        )
+
+    def remove_report(self, report_id: int):
+        with self._connect() as conn:
+            self._delete_pages(conn, report_id)
+            conn.execute("DELETE FROM indexed_reports WHERE report_id = ?", (report_id,))
+
+    def indexed_report_ids(self) -> set:
+        with self._connect() as conn:
+            return {row[0] for row in conn.execute("SELECT report_id FROM indexed_reports")}
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM pages")
+            conn.execute("DELETE FROM indexed_reports")
+
+    def optimize(self):
+        """
+        Merges the index segments; worth running after a large rebuild.
+        """
+        with self._connect() as conn:
+            conn.execute("INSERT INTO pages (pages) VALUES ('optimize')")
+
+    def search(self, query: str, company_ids=None, years=None, limit=20, offset=0) -> list:
+        """
+        Pages matching an FTS5 query ("going concern", deloitte OR kpmg,
+        audit*), best match first, as dicts of report_id, company_id, year,
+        page, score and an HTML snippet with the matches in <mark> tags.
+        company_ids and years narrow the search when given.
+        """
+        sql = (
+            "SELECT report_id, company_id, year, page, bm25(pages),"
+            " snippet(pages, 0, ?, ?, '…', ?) FROM pages WHERE pages MATCH ?"
+        )
+        params = [_OPEN, _CLOSE, SNIPPET_TOKENS, query]
+        if company_ids is not None:
+            sql += f" AND company_id IN ({','.join('?' * len(company_ids))})"
+            params.extend(company_ids)
+        if years is not None:
+            sql += f" AND year IN ({','.join('?' * len(years))})"
+            params.extend(years)
+        sql += " ORDER BY rank LIMIT ? OFFSET ?"
+        params.extend([limit, offset])
+
+        try:
+            with self._connect() as conn:
+                rows = conn.execute(sql, params).fetchall()
+        except sqlite3.OperationalError as e:
+            # Only a malformed query is the caller's fault; a locked or
+            # unreadable index is left to surface as a server error.
+            if not _is_query_error(e):
+                raise
+            raise SearchQueryError(f"Invalid search query: {e}") from e
+        return [
+            {
+                "report_id": report_id,
+                "company_id": company_id,
+                "year": year,
+                "page": page,
+                # bm25 is lower for better matches.
+                "score": -score,
+                "snippet": html.escape(" ".join(snippet.split()))
+                .replace(_OPEN, "<mark>").replace(_CLOSE, "</mark>"),
+            }
+            for report_id, company_id, year, page, score, snippet in rows
+        ]
@@ -0,0 +1,255 @@
+import re
+from services.extraction import STATEMENT_HEADINGS
+from services.telemetry import timed
+
+# Heading phrases, lower-cased, naming the statement whose tables follow.
+# None marks sections whose tables are not primary statements.
+STATEMENT_TYPES = tuple((heading, "Balance Sheet") for heading in STATEMENT_HEADINGS) + (
+    ("statement of comprehensive income", "Income Statement"),
+    ("statement of profit or loss", "Income Statement"),
+    ("income statement", "Income Statement"),
+    ("profit and loss", "Income Statement"),
+    ("statement of cash flows", "Cash Flow Statement"),
+    ("cash flow statement", "Cash Flow Statement"),
+    ("statement of changes in equity", None),
+    ("notes to the", None),
+)
+
+_YEAR = re.compile(r"(19|20)\d{2}")
+_AMOUNT = re.compile(r"\(?-?\d[\d,]*(?:\.\d+)?\)?")
+_DASHES = {"-", "–", "—"}
+_THOUSANDS = re.compile(r"[‘’'`]?000|thousands?")
+_MILLIONS = re.compile(r"[‘’'`]?m|millions?")
+_NOTE_REF = re.compile(r"\d{1,2}(?:\.\d{1,2})?|\(?[ivx]+\)?")
+
+# Vertical distance (in points) within which words are on the same row.
+_ROW_TOLERANCE = 2.5
+# How far above or below the year row a unit marker ("KShs '000") may sit.
+_HEADER_BAND = 20
+
+
+def _amount(text: str):
+    """
+    The value of a figure cell, or None when text is not one. A dash is
+    nil; "(1,234)" is negative. A lone parenthesis on one side is a
+    rendering artifact, not a sign.
+    """
+    if text in _DASHES:
+        return 0.0
+    if not _AMOUNT.fullmatch(text):
+        return None
+    negative = (text.startswith("(") and text.endswith(")")) or text.startswith("-")
+    value = float(text.strip("()-").replace(",", ""))
+    return -value if negative else value
+
+
+def _rows(words):
+    """
+    Groups words into rows by vertical position, top to bottom, each row
+    sorted left to right.
+    """
+    rows = []
+    for word in sorted(words, key=lambda w: (w[1] + w[3]) / 2):
+        middle = (word[1] + word[3]) / 2
+        if rows and middle - rows[-1][0] <= _ROW_TOLERANCE:
+            rows[-1][1].append(word)
+        else:
+            rows.append((middle, [word]))
+    return [(middle, sorted(row, key=lambda w: w[0])) for middle, row in rows]
+
+
+def _is_label_word(text: str) -> bool:
+    return _amount(text) is None and text not in ("(", ")")
+
+
+def _tables(rows):
+    """
+    Finds the figure tables on a page from their year header rows. Returns
+    (header_y, anchors) per table, anchors being (x1, year) of each column
+    left to right. Columns of one table are evenly spaced, so a gap of
+    more than twice the narrowest one splits a header row into separate
+    tables (statements laid out side by side).
+    """
+    tables = []
+    for middle, row in rows:
+        years = [w for w in row if _YEAR.fullmatch(w[4])]
+        if len(years) < 2:
+            continue
+        narrowest = min(b[2] - a[2] for a, b in zip(years, years[1:]))
+        current = [years[0]]
+        for previous, year in zip(years, years[1:]):
+            if year[2] - previous[2] > 2 * narrowest:
+                tables.append((middle, current))
+                current = []
+            current.append(year)
+        tables.append((middle, current))
+    return [(middle, [(w[2], int(w[4])) for w in table]) for middle, table in tables if len(table) >= 2]
+
+
+def _statement_type(headings, left, right, header_y, default):
+    """
+    The statement named by the nearest heading above the table that
+    overlaps it horizontally, else `default`.
+    """
+    found = default
+    best_y = None
+    for y, x0, x1, text in headings:
+        if y > header_y + _ROW_TOLERANCE or x1 < left or x0 > right:
+            continue
+        for phrase, statement_type in STATEMENT_TYPES:
+            if phrase in text and (best_y is None or y > best_y):
+                found, best_y = statement_type, y
+                break
+    return found
+
+
+def _names_statement(text: str) -> bool:
+    return any(phrase in text for phrase, _ in STATEMENT_TYPES)
+
+
+def _strip_empty(rows, y, left, right) -> bool:
+    # True when nothing sits beside a heading in a table's strip, i.e. the
+    # heading starts a new section across the page.
+    return not any(
+        left <= (w[0] + w[2]) / 2 < right
+        for middle, row in rows if abs(middle - y) <= _ROW_TOLERANCE
+        for w in row
+    )
+
+
+def _headings(page):
+    lines = {}
+    for x0, y0, x1, y1, text, block, line, _ in page.get_text("words"):
+        entry = lines.setdefault((block, line), [x0, y0, x1, y1, []])
+        entry[0], entry[1] = min(entry[0], x0), min(entry[1], y0)
+        entry[2], entry[3] = max(entry[2], x1), max(entry[3], y1)
+        entry[4].append(text)
+    return [((y0 + y1) / 2, x0, x1, " ".join(words).lower()) for x0, y0, x1, y1, words in lines.values()]
+
+
+def _scale(rows, left, right, header_y) -> int:
+    for middle, row in rows:
+        if abs(middle - header_y) > _HEADER_BAND:
+            continue
+        for word in row:
+            if left <= word[0] and word[2] <= right + 10:
+                text = word[4].lower()
+                if _THOUSANDS.fullmatch(text):
+                    return 1000
+                if _MILLIONS.fullmatch(text):
+                    return 1000000
+    return 1
+
+
+def _parse_table(rows, anchors, left, right, top, bottom, scale):
+    """
+    Reads the rows of one table. Figures are matched to the column whose
+    header they are right-aligned with; label-only rows are section
+    headings, and figure rows without a label are that section's total.
+    """
+    spacing = min(b[0] - a[0] for a, b in zip(anchors, anchors[1:]))
+    tolerance = max(12.0, spacing * 0.45)
+    label_edge = anchors[0][0] - spacing * 0.5
+
+    items = []
+    section = None
+    for middle, row in rows:
+        if middle <= top + _ROW_TOLERANCE or middle >= bottom:
+            continue
+        words = [w for w in row if left <= (w[0] + w[2]) / 2 < right]
+        if not words or any(_THOUSANDS.fullmatch(w[4].lower()) for w in words):
+            continue
+
+        label_words = [w[4] for w in words if (w[0] + w[2]) / 2 < label_edge and _is_label_word(w[4])]
+        while label_words and _NOTE_REF.fullmatch(label_words[-1].lower()):
+            label_words.pop()
+        label = " ".join(label_words).strip()
+        if not any(ch.isalpha() for ch in label):
+            label = ""
+
+        figures = {}
+        for word in words:
+            value = _amount(word[4])
+            # A bare year among figure columns is prose, not an amount.
+            if value is None or _YEAR.fullmatch(word[4]):
+                continue
+            column, distance = min(
+                ((i, abs(word[2] - x1)) for i, (x1, _) in enumerate(anchors)), key=lambda c: c[1]
+            )
+            if distance <= tolerance:
+                figures.setdefault(column, value)
+
+        if not figures:
+            if label:
+                section = label
+            continue
+        if not label:
+            if not section:
+                continue
+            label = f"Total {section.lower()}" if not section.lower().startswith("total") else section
+        # Per-share figures are stated in units whatever the table scale.
+        row_scale = 1 if "per share" in label.lower() else scale
+        for column, value in sorted(figures.items()):
+            items.append((label, value * row_scale, anchors[column][1], column))
+    return items
+
+
+@timed("statements.parse")
+def parse_statements(doc) -> list:
+    """
+    Reads every balance sheet, income statement and cash flow table in the
+    document into line items: dicts of statement_type, line_item, amount,
+    year and column (0 for the first figure column, usually the current
+    year). Uses word coordinates, so comparative columns and statements
+    laid out side by side are kept apart. Statements continuing onto a
+    page without a heading keep the previous page's type.
+    """
+    items = []
+    carried = None
+    for page in doc:
+        words = page.get_text("words")
+        if not words:
+            continue
+        rows = _rows(words)
+        tables = sorted(_tables(rows), key=lambda t: t[1][0][0])
+        if not tables:
+            continue
+        headings = _headings(page)
+
+        # Each table owns the strip of the page from the previous table's
+        # last column to its own, and runs down to the next table or
+        # statement heading below it.
+        edges = [0.0] + [anchors[-1][0] + 12 for _, anchors in tables]
+        edges[-1] = page.rect.x1
+        for i, (header_y, anchors) in enumerate(tables):
+            left, right = edges[i], edges[i + 1]
+            bottom = min(
+                [y for y, other in tables if y > header_y and other[0][0] <= right and other[-1][0] >= left]
+                + [y for y, x0, x1, text in headings if y > header_y and _names_statement(text)
+                   and ((x0 < right and x1 > left) or _strip_empty(rows, y, left, right))],
+                default=page.rect.y1,
+            )
+            statement_type = _statement_type(headings, left, right, header_y, carried)
+            carried = statement_type
+            if statement_type is None:
+                continue
+            scale = _scale(rows, left, right, header_y)
+            for line_item, amount, year, column in _parse_table(rows, anchors, left, right, header_y, bottom, scale):
+                items.append({
+                    "statement_type": statement_type,
+                    "line_item": line_item,
+                    "amount": amount,
+                    "year": year,
+                    "column": column,
+                })
+    return items
+
+
+def parse_statements_file(path: str) -> list:
+    """
+    Same as parse_statements, for a PDF on disk.
+    """
+    import fitz  # PyMuPDF, loaded on first use
+
+    with fitz.open(path) as doc:
+        return parse_statements(doc)
@@ -0,0 +1,36 @@
+import os
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class FileTooLarge(Exception):
+    pass
+
+
+def save_stream(src, path: str, max_bytes=None, chunk_size=CHUNK_SIZE) -> int:
+    """
+    Copies a file object to `path` in fixed-size chunks, so the whole file
+    never sits in memory, and returns the number of bytes written. The
+    data goes to a temporary name first and only replaces `path` once it
+    is complete; FileTooLarge is raised (and nothing is kept) if it runs
+    past max_bytes.
+    """
+    partial = path + ".part"
+    size = 0
+    try:
+        with open(partial, "wb") as out:
+            while True:
+                chunk = src.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise FileTooLarge(f"file exceeds {max_bytes / (1024 * 1024):g} MB")
+                out.write(chunk)
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return size
+
@@ -0,0 +1,218 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+# Allows a request to ask for a sampling profile with ?profile=1. Off by
+# default: the profile replaces the response.
+PROFILING_ENABLED = os.getenv("AFRS_PROFILING", "0") == "1"
+PROFILE_INTERVAL = float(os.getenv("AFRS_PROFILE_INTERVAL_MS", 1)) / 1000
+
+# Upper bounds (seconds) of the histogram buckets, from sub-millisecond
+# queries to multi-second extractions.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Histogram:
+    """
+    A Prometheus-style histogram with labels. Thread-safe; values live in
+    this process only.
+    """
+
+    def __init__(self, name, help_text, label_names, buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += 1
+            series[2] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, ([*counts], count, total)) for labels, (counts, count, total) in self._series.items())
+        for labels, (counts, count, total) in series:
+            pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels)]
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_labels(pairs, bound)} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_labels(pairs, '+Inf')} {count}")
+            lines.append(f"{self.name}_count{_labels(pairs)} {count}")
+            lines.append(f"{self.name}_sum{_labels(pairs)} {total}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs, le=None) -> str:
+    if le is not None:
+        pairs = pairs + [f'le="{le}"']
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+HTTP_REQUESTS = Histogram("afrs_http_request_duration_seconds", "HTTP request latency.", ("method", "route", "status"))
+SPANS = Histogram("afrs_span_duration_seconds", "Time spent in named stages.", ("span",))
+DB_QUERIES = Histogram("afrs_db_query_duration_seconds", "SQL statement latency.", ("statement",))
+
+
+def render_metrics() -> str:
+    lines = []
+    for histogram in (HTTP_REQUESTS, SPANS, DB_QUERIES):
+        lines.extend(histogram.render())
+    return "\n".join(lines) + "\n"
+
+
+# Per-request totals, {name: [count, seconds]}, for the Server-Timing
+# header. Set by the request middleware.
+_request_timings = ContextVar("afrs_request_timings", default=None)
+# Every (name, seconds) span of a worker job, in order. Set by collect_spans.
+_collected_spans = ContextVar("afrs_collected_spans", default=None)
+
+
+def _add_timing(name: str, seconds: float):
+    timings = _request_timings.get()
+    if timings is not None:
+        entry = timings.setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+
+def record_span(name: str, seconds: float):
+    SPANS.observe(seconds, name)
+    _add_timing(name, seconds)
+    collected = _collected_spans.get()
+    if collected is not None:
+        collected.append((name, seconds))
+
+
+def record_query(statement: str, seconds: float):
+    DB_QUERIES.observe(seconds, statement)
+    _add_timing("db", seconds)
+
+
+@contextmanager
+def span(name: str):
+    """
+    Times the enclosed block as a named stage.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - start)
+
+
+def timed(name: str):
+    """
+    Decorator form of span().
+    """
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+@contextmanager
+def request_timings():
+    """
+    Collects the spans and queries of the enclosed block (a request) and
+    yields their {name: [count, seconds]} totals.
+    """
+    timings = {}
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+def server_timing(timings, total: float) -> str:
+    entries = [f'{name.replace(".", "-")};dur={seconds * 1000:.1f};desc="{count}x"'
+               for name, (count, seconds) in timings.items()]
+    return ", ".join(entries + [f"total;dur={total * 1000:.1f}"])
+
+
+def collect_spans(func, *args):
+    """
+    Runs func(*args) and returns (result, spans), spans being the
+    (name, seconds) of every span inside it, one entry per span even when
+    a name repeats. For worker processes, whose histograms the server
+    never sees: the caller passes spans to record_spans.
+    """
+    spans = []
+    token = _collected_spans.set(spans)
+    try:
+        result = func(*args)
+    finally:
+        _collected_spans.reset(token)
+    return result, spans
+
+
+def record_spans(spans):
+    for name, seconds in spans:
+        record_span(name, seconds)
+
+
+# Leaf functions of threads that are parked, not working.
+_IDLE = {"wait", "select", "poll", "epoll", "_worker", "accept", "get", "sleep", "run_forever", "_run_once"}
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of every thread except its own every `interval`
+    seconds and counts them in collapsed-stack form ("a;b;c 12"), the input
+    of flamegraph.pl and speedscope. Sync endpoints run on threadpool
+    threads, so all threads are sampled; other requests in flight at the
+    same time show up too. Idle threads are left out.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="afrs-profiler", daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or frame.f_code.co_name in _IDLE:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())